@@ -1,33 +1,160 @@
 from __future__ import annotations
 
 from pathlib import Path
+import hashlib
 import os
+import re
 
-from flask import Flask, flash, redirect, render_template, request, url_for
+from flask import Flask, Response, abort, flash, g, jsonify, redirect, render_template, request, session, url_for
 
-from health_app.db import ensure_db
-from health_app.ml import load_model_bundle, predict_risk, train_model_from_csv
+from health_app.cache import VersionedCache
+from health_app.compress import codec_from_spec, gzip_stream, set_active_codec
+from health_app.db import ensure_db, get_pool
+from health_app.history import score_history
+from health_app.ingest import bulk_import
+from health_app.instrumentation import InstrumentationConfig, install_instrumentation, span
+from health_app.jobs import JobRunner, read_job, train_model_job
+from health_app.ml import DEFAULT_FEATURES, ModelRegistry, ensure_scorer, predict_risk
 from health_app.recommendations import build_recommendations
 from health_app.repo import (
-    export_all_data,
+    DEFAULT_USER,
+    EXPORT_FORMATS,
+    get_data_version,
+    get_db_identity,
     get_latest_entry,
     get_profile,
+    iter_export,
     list_recent_entries,
     save_daily_entry,
+    save_outcome,
     save_profile,
 )
-from health_app.utils import parse_float, parse_int
+from health_app.rolling import RollingFeatureEngine
+from health_app.rollups import list_rollups
+from health_app.rules import DEFAULT_RULES_PATH, RuleRegistry
+from health_app.scoring import load_scorer, scorer_path
+from health_app.utils import parse_date, parse_float, parse_int, parse_timestamp
 
+USER_ID_RE = re.compile(r"^[A-Za-z0-9_.-]{1,64}$")
 
-def create_app() -> Flask:
+API_MAX_BATCH = 5000
+
+PROFILE_NUMBERS = {
+    "age": parse_int,
+    "weight_kg": parse_float,
+    "height_cm": parse_float,
+    "bp_systolic": parse_int,
+    "bp_diastolic": parse_int,
+    "sugar_mg_dl": parse_float,
+}
+PROFILE_TEXT = ("past_diseases", "medications", "notes")
+
+CHECKIN_NUMBERS = {
+    "steps": parse_int,
+    "sleep_hours": parse_float,
+    "heart_rate": parse_int,
+    "calories": parse_int,
+    "activity_minutes": parse_int,
+    "sleep_quality": parse_int,
+    "mood": parse_int,
+    "stress": parse_int,
+    "pain": parse_int,
+    "bp_systolic": parse_int,
+    "bp_diastolic": parse_int,
+    "sugar_mg_dl": parse_float,
+}
+
+
+def _text(value) -> str | None:
+    return None if value is None else str(value)
+
+
+def profile_payload(data) -> dict:
+    payload = {k: parse(_text(data.get(k))) for k, parse in PROFILE_NUMBERS.items()}
+    payload.update({k: (_text(data.get(k)) or "").strip() for k in PROFILE_TEXT})
+    return payload
+
+
+def checkin_payload(data) -> dict:
+    payload = {"entry_date": data.get("entry_date")}
+    payload.update({k: parse(_text(data.get(k))) for k, parse in CHECKIN_NUMBERS.items()})
+    payload["notes"] = (_text(data.get("notes")) or "").strip()
+    return payload
+
+
+def with_etag(response: Response, etag: str) -> Response:
+    response.set_etag(etag)
+    # Per-user data: browsers may keep it, but must revalidate before reuse.
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+
+def not_modified(etag: str) -> Response | None:
+    if not request.if_none_match.contains_weak(etag):
+        return None
+    return with_etag(Response(status=304), etag)
+
+
+def build_version(base_dir: Path) -> str:
+    # Changes when the code or templates are redeployed, so a browser's copy of a page rendered by the old code
+    # no longer revalidates. Derived from the files, so every worker of one deploy agrees on it.
+    digest = hashlib.blake2b(digest_size=6)
+    paths = [base_dir / "app.py", *base_dir.glob("health_app/*.py"), *base_dir.glob("templates/**/*")]
+    for path in sorted(p for p in paths if p.is_file()):
+        st = path.stat()
+        digest.update(f"{path.relative_to(base_dir)}:{st.st_mtime_ns}:{st.st_size}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def create_app(instance_dir: Path | None = None) -> Flask:
     app = Flask(__name__)
     app.secret_key = "local-dev-secret"  
 
     base_dir = Path(__file__).resolve().parent
-    db_path = base_dir / "instance" / "health.db"
-    model_path = base_dir / "instance" / "model_bundle.joblib"
+    instance_dir = Path(instance_dir) if instance_dir else base_dir / "instance"
+    db_path = instance_dir / "health.db"
+    model_path = instance_dir / "model_bundle.joblib"
 
     ensure_db(db_path)
+    set_active_codec(codec_from_spec(os.environ.get("HEALTH_CODEC", "zlib:6")))
+    pool = get_pool(db_path)
+    ensure_scorer(model_path)
+    models = ModelRegistry(scorer_path(model_path), load_scorer)
+    # Load now so preforking servers share the model; the registry still swaps in newer files per request.
+    models.get()
+    # Recommendation rules reload the same way; an edit that fails to compile is logged and the old rules stay.
+    rules = RuleRegistry(
+        Path(os.environ.get("HEALTH_RULES", DEFAULT_RULES_PATH)),
+        on_error=lambda e: app.logger.warning("Keeping the previous recommendation rules: %s", e),
+    )
+    rules.get()
+    install_instrumentation(app, InstrumentationConfig.from_env(instance_dir))
+    # Prefixes every cache tag: the deployed code, and the database file (its counters restart if it is recreated).
+    app_version = f"{build_version(base_dir)}-{get_db_identity(pool.connection())}"
+    dashboards = VersionedCache(int(os.environ.get("HEALTH_DASHBOARD_CACHE", "256")))
+    jobs_dir = instance_dir / "jobs"
+    jobs = JobRunner(jobs_dir, max_workers=int(os.environ.get("HEALTH_JOB_WORKERS", "1")))
+
+    @app.url_value_preprocessor
+    def pull_user_id(endpoint, values):
+        user_id = (values or {}).pop("user_id", DEFAULT_USER)
+        if not USER_ID_RE.match(user_id):
+            abort(404)
+        g.user_id = user_id
+
+    @app.url_defaults
+    def add_user_id(endpoint, values):
+        if "user_id" not in values and app.url_map.is_endpoint_expecting(endpoint, "user_id"):
+            values["user_id"] = g.get("user_id", DEFAULT_USER)
+
+    def user_route(rule: str, scoped_rule: str | None = None, **options):
+        # Every page is served for the default user at its plain path and for any other user under /u/<user_id>.
+        def decorator(view):
+            app.add_url_rule(rule, view_func=view, defaults={"user_id": DEFAULT_USER}, **options)
+            app.add_url_rule(scoped_rule or f"/u/<user_id>{rule}", view_func=view, **options)
+            return view
+
+        return decorator
 
     @app.get("/@vite/client")
     def vite_client():
@@ -37,85 +164,152 @@ def create_app() -> Flask:
     def react_refresh():
         return ("", 204)
 
-    @app.get("/")
-    def dashboard():
-        profile = get_profile(db_path)
-        latest = get_latest_entry(db_path)
-        recent = list_recent_entries(db_path, limit=30)
+    def dashboard_data(user_id: str) -> dict:
+        with span("db"):
+            conn = pool.connection()
+            profile = get_profile(conn, user_id)
+            latest = get_latest_entry(conn, user_id)
+            recent = list_recent_entries(conn, limit=30, user_id=user_id)
+            weekly = list_rollups(conn, user_id, "week", limit=8)
+            monthly = list_rollups(conn, user_id, "month", limit=6)
 
-        model_bundle = load_model_bundle(model_path)
+        with span("model"):
+            model_bundle = models.get()
         model_score = None
         if latest is not None and model_bundle is not None:
-            model_score = predict_risk(model_bundle, profile, latest, recent)
-
-        recos = build_recommendations(profile, latest, model_score)
-        return render_template(
-            "dashboard.html",
-            profile=profile,
-            latest=latest,
-            recent=recent,
-            model_score=model_score,
-            model_trained=model_bundle is not None,
-            recommendations=recos,
-        )
+            with span("score"):
+                rolling = RollingFeatureEngine.from_entries(reversed(recent)).means()
+                model_score = predict_risk(model_bundle, profile, latest, recent, rolling_means=rolling)
 
-    @app.post("/train")
-    def train():
+        with span("recommend"):
+            recos = build_recommendations(profile, latest, model_score, rules.get())
+        return {
+            "profile": profile,
+            "latest": latest,
+            "recent": recent,
+            "weekly": weekly,
+            "monthly": monthly,
+            "model_score": model_score,
+            "model_trained": model_bundle is not None,
+            "recommendations": recos,
+        }
+
+    def dashboard_etag(user_id: str) -> str:
+        # Changes whenever the user's data is written, the model or rules file is replaced, or the app is redeployed.
+        with span("db"):
+            version = get_data_version(pool.connection(), user_id)
+        return f"{app_version}-{version}-{models.version}-{rules.version}"
+
+    def cached_dashboard(user_id: str, etag: str) -> dict:
+        # The version is read before the data, so a concurrent write can only leave newer data under an older tag.
+        slot = dashboards.get(user_id, etag)
+        if slot is None:
+            slot = dashboards.put(user_id, etag, {"data": dashboard_data(user_id)})
+        return slot
+
+    @user_route("/", methods=["GET"])
+    def dashboard():
+        if "_flashes" in session:
+            # Pending flash messages are rendered into the page, so this response is neither cached nor tagged.
+            data = dashboard_data(g.user_id)
+            with span("render"):
+                return render_template("dashboard.html", **data)
+
+        etag = dashboard_etag(g.user_id)
+        cached = not_modified(etag)
+        if cached is not None:
+            return cached
+        slot = cached_dashboard(g.user_id, etag)
+        if "html" not in slot:
+            with span("render"):
+                slot["html"] = render_template("dashboard.html", **slot["data"])
+        return with_etag(app.response_class(slot["html"]), etag)
+
+    def start_training(k_best: int = 10, streaming: bool = False, **source) -> tuple[str, bool]:
+        # Runs in a separate process; the registry picks up the new model files once they are renamed into place.
         csv_path = base_dir / "data" / "sample_training_data.csv"
-        try:
-            bundle = train_model_from_csv(csv_path, model_path, k_best=10)
-        except Exception as e:
-            flash(f"Training failed: {e}")
-            return redirect(url_for("dashboard"))
+        return jobs.submit(
+            "train",
+            train_model_job,
+            csv_path=str(csv_path),
+            model_path=str(model_path),
+            k_best=k_best,
+            streaming=streaming,
+            **source,
+        )
 
-        flash(f"Model trained locally. Selected {len(bundle.selected_features)} features.")
+    @user_route("/train", methods=["POST"])
+    def train():
+        job_id, started = start_training()
+        if started:
+            flash(f"Model training started in the background (job {job_id}).")
+        else:
+            flash(f"Model training is already running (job {job_id}).")
         return redirect(url_for("dashboard"))
 
-    @app.get("/profile")
+    @app.post("/api/v1/jobs/train")
+    def api_train():
+        body = request.get_json(silent=True) or {}
+        k_best = body.get("k_best", 10)
+        if type(k_best) is not int or not 1 <= k_best <= len(DEFAULT_FEATURES):
+            return jsonify({"error": f"k_best must be an integer from 1 to {len(DEFAULT_FEATURES)}"}), 400
+        if body.get("source", "csv") not in ("csv", "features"):
+            return jsonify({"error": "source must be csv or features"}), 400
+        source = {}
+        if body.get("source") == "features":
+            # Stored check-in features with recorded outcomes, optionally limited to a created_at window.
+            source["db_path"] = str(db_path)
+            for key in ("since", "until"):
+                value = body.get(key)
+                source[key] = parse_timestamp(value) if isinstance(value, str) else None
+                if value is not None and source[key] is None:
+                    return jsonify({"error": f"{key} must be an ISO date or datetime"}), 400
+        job_id, started = start_training(k_best, bool(body.get("streaming")), search=bool(body.get("search")), **source)
+        status_url = url_for("api_job", job_id=job_id)
+        return jsonify({"job_id": job_id, "started": started, "status_url": status_url}), 202, {"Location": status_url}
+
+    @app.get("/api/v1/jobs/<job_id>")
+    def api_job(job_id: str):
+        status = read_job(jobs_dir, job_id)
+        if status is None:
+            return jsonify({"error": "Unknown job."}), 404
+        response = jsonify(status)
+        response.headers["Cache-Control"] = "no-store"
+        return response
+
+    @user_route("/api/v1/risk-history", "/api/v1/users/<user_id>/risk-history", methods=["GET"])
+    def risk_history():
+        with span("model"):
+            scorer = models.get()
+        if scorer is None:
+            return jsonify({"error": "Model not trained yet."}), 409
+        conn = pool.connection()
+        with span("score"):
+            scores = score_history(conn, scorer, get_profile(conn, g.user_id), g.user_id)
+        return jsonify({"model_version": models.version, "count": len(scores), "scores": scores})
+
+    @user_route("/profile", methods=["GET"])
     def profile_page():
-        profile = get_profile(db_path)
+        profile = get_profile(pool.connection(), g.user_id)
         return render_template("profile.html", profile=profile)
 
-    @app.post("/profile")
+    @user_route("/profile", methods=["POST"])
     def profile_save():
-        payload = {
-            "age": parse_int(request.form.get("age")),
-            "weight_kg": parse_float(request.form.get("weight_kg")),
-            "height_cm": parse_float(request.form.get("height_cm")),
-            "bp_systolic": parse_int(request.form.get("bp_systolic")),
-            "bp_diastolic": parse_int(request.form.get("bp_diastolic")),
-            "sugar_mg_dl": parse_float(request.form.get("sugar_mg_dl")),
-            "past_diseases": request.form.get("past_diseases", "").strip(),
-            "medications": request.form.get("medications", "").strip(),
-            "notes": request.form.get("notes", "").strip(),
-        }
-        save_profile(db_path, payload)
+        payload = profile_payload(request.form)
+        with span("db"):
+            save_profile(pool.connection(), payload, g.user_id)
         flash("Profile saved locally.")
         return redirect(url_for("profile_page"))
 
-    @app.get("/checkin")
+    @user_route("/checkin", methods=["GET"])
     def checkin_page():
         return render_template("checkin.html")
 
-    @app.post("/checkin")
+    @user_route("/checkin", methods=["POST"])
     def checkin_save():
-        payload = {
-            "entry_date": request.form.get("entry_date"),
-            "steps": parse_int(request.form.get("steps")),
-            "sleep_hours": parse_float(request.form.get("sleep_hours")),
-            "heart_rate": parse_int(request.form.get("heart_rate")),
-            "calories": parse_int(request.form.get("calories")),
-            "activity_minutes": parse_int(request.form.get("activity_minutes")),
-            "sleep_quality": parse_int(request.form.get("sleep_quality")),
-            "mood": parse_int(request.form.get("mood")),
-            "stress": parse_int(request.form.get("stress")),
-            "pain": parse_int(request.form.get("pain")),
-            "bp_systolic": parse_int(request.form.get("bp_systolic")),
-            "bp_diastolic": parse_int(request.form.get("bp_diastolic")),
-            "sugar_mg_dl": parse_float(request.form.get("sugar_mg_dl")),
-            "notes": request.form.get("notes", "").strip(),
-        }
-        ok, msg = save_daily_entry(db_path, payload)
+        payload = checkin_payload(request.form)
+        with span("db"):
+            ok, msg = save_daily_entry(pool.connection(), payload, g.user_id)
         if not ok:
             flash(msg)
             return redirect(url_for("checkin_page"))
@@ -123,15 +317,95 @@ def create_app() -> Flask:
         flash("Check-in saved locally.")
         return redirect(url_for("dashboard"))
 
-    @app.get("/export")
+    # JSON API. Plain sync views: the server's worker threads give the concurrency, and each reuses its pooled connection.
+    @user_route("/api/v1/dashboard", "/api/v1/users/<user_id>/dashboard", methods=["GET"])
+    def api_dashboard():
+        user_id = g.user_id
+        etag = dashboard_etag(user_id)
+        cached = not_modified(etag)
+        if cached is not None:
+            return cached
+        slot = cached_dashboard(user_id, etag)
+        return with_etag(jsonify({"user_id": user_id, "model_version": models.version, **slot["data"]}), etag)
+
+    @user_route("/api/v1/profile", "/api/v1/users/<user_id>/profile", methods=["GET"])
+    def api_profile():
+        user_id = g.user_id
+        profile = get_profile(pool.connection(), user_id)
+        return jsonify({"user_id": user_id, "profile": profile})
+
+    @user_route("/api/v1/profile", "/api/v1/users/<user_id>/profile", methods=["PUT"])
+    def api_profile_save():
+        body = request.get_json(silent=True)
+        if not isinstance(body, dict):
+            return jsonify({"error": "Expected a JSON object with profile fields."}), 400
+        user_id, payload = g.user_id, profile_payload(body)
+        save_profile(pool.connection(), payload, user_id)
+        return jsonify({"user_id": user_id, "profile": payload})
+
+    @user_route("/api/v1/checkins", "/api/v1/users/<user_id>/checkins", methods=["POST"])
+    def api_checkins():
+        # Accepts one entry, a list of entries, or {"entries": [...]}; a batch is imported in one transaction.
+        body = request.get_json(silent=True)
+        if isinstance(body, dict):
+            entries = body["entries"] if "entries" in body else [body]
+        else:
+            entries = body
+        if not isinstance(entries, list) or not entries or not all(isinstance(e, dict) for e in entries):
+            return jsonify({"error": "Expected a check-in object, a list of them, or {\"entries\": [...]}."}), 400
+        if len(entries) > API_MAX_BATCH:
+            return jsonify({"error": f"At most {API_MAX_BATCH} check-ins per request."}), 413
+
+        user_id = g.user_id
+        result = bulk_import(pool.connection(), entries, user_id=user_id)
+        body = {"user_id": user_id, "imported": result.rows, "skipped": result.skipped, "errors": result.errors}
+        return jsonify(body), 201 if result.rows else 400
+
+    @user_route(
+        "/api/v1/checkins/<entry_id>/outcome", "/api/v1/users/<user_id>/checkins/<entry_id>/outcome", methods=["PUT"]
+    )
+    def api_outcome(entry_id: str):
+        body = request.get_json(silent=True)
+        label = body.get("label") if isinstance(body, dict) else None
+        if type(label) is not int or label not in (0, 1):
+            return jsonify({"error": "Expected {\"label\": 0} or {\"label\": 1}."}), 400
+        user_id = g.user_id
+        if not save_outcome(pool.connection(), entry_id, label, user_id):
+            return jsonify({"error": "Unknown check-in."}), 404
+        return jsonify({"user_id": user_id, "entry_id": entry_id, "label": label})
+
+    @user_route("/export", methods=["GET"])
     def export_data():
-        data = export_all_data(db_path)
-        return app.response_class(
-            response=data,
+        fmt = request.args.get("format", "json")
+        if fmt not in EXPORT_FORMATS:
+            return jsonify({"error": f"format must be one of {', '.join(EXPORT_FORMATS)}"}), 400
+        dates = {}
+        for key in ("start", "end"):
+            raw = request.args.get(key)
+            dates[key] = parse_date(raw)
+            if raw and dates[key] is None:
+                return jsonify({"error": f"{key} must be a YYYY-MM-DD date"}), 400
+
+        conn = pool.connection()
+        # The tag only covers the data; format, range and gzip are part of the URL and so of the cache key.
+        etag = f"{app_version}-{get_data_version(conn, g.user_id)}"
+        cached = not_modified(etag)
+        if cached is not None:
+            return cached
+
+        # Rows are read from the cursor in batches as the client consumes the body.
+        body = iter_export(conn, g.user_id, fmt=fmt, **dates)
+        filename = f"health_export.{fmt}"
+        mimetype = "application/x-ndjson" if fmt == "ndjson" else "application/json"
+        if request.args.get("gzip") == "1":
+            body, filename, mimetype = gzip_stream(body), filename + ".gz", "application/gzip"
+        response = app.response_class(
+            response=body,
             status=200,
-            mimetype="application/json",
-            headers={"Content-Disposition": "attachment; filename=health_export.json"},
+            mimetype=mimetype,
+            headers={"Content-Disposition": f"attachment; filename={filename}"},
         )
+        return with_etag(response, etag)
 
     return app
 
@@ -0,0 +1,32 @@
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+
+
+class VersionedCache:
+    # One slot per key, valid only for the version it was stored under; least recently used keys are evicted.
+    def __init__(self, maxsize: int = 256) -> None:
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._items: OrderedDict[str, tuple[str, dict]] = OrderedDict()
+
+    def get(self, key: str, version: str) -> dict | None:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None or item[0] != version:
+                return None
+            self._items.move_to_end(key)
+            return item[1]
+
+    def put(self, key: str, version: str, value: dict) -> dict:
+        with self._lock:
+            self._items[key] = (version, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import sqlite3
+
+from .compress import Codec, decode_bytes, register_dictionary, train_dictionary
+from .db import transaction
+
+
+BLOB_TABLES: dict[str, tuple[str, str, str]] = {
+    "medical_profile": ("user_id", "codec", "blob"),
+    "daily_entry": ("id", "extras_codec", "extras_blob"),
+    "daily_entry_features": ("entry_id", "codec", "blob"),
+}
+
+
+def recode_table(
+    conn: sqlite3.Connection,
+    table: str,
+    codec: Codec,
+    batch_size: int = 1000,
+    force: bool = False,
+) -> tuple[int, int, int]:
+    key, codec_col, blob_col = BLOB_TABLES[table]
+    where = f"{blob_col} IS NOT NULL" if force else f"{blob_col} IS NOT NULL AND {codec_col} != ?"
+    params: tuple = () if force else (codec.tag,)
+
+    rewritten = bytes_before = bytes_after = 0
+    last_rowid = 0
+    while True:
+        rows = conn.execute(
+            f"SELECT rowid, {codec_col} AS codec, {blob_col} AS blob FROM {table} "
+            f"WHERE rowid > ? AND {where} ORDER BY rowid LIMIT ?",
+            (last_rowid, *params, batch_size),
+        ).fetchall()
+        if not rows:
+            break
+        updates = []
+        for r in rows:
+            data = decode_bytes(r["codec"], r["blob"])
+            blob = codec.encode(data)
+            bytes_before += len(r["blob"])
+            bytes_after += len(blob)
+            updates.append((codec.tag, sqlite3.Binary(blob), r["rowid"]))
+        with transaction(conn):
+            conn.executemany(f"UPDATE {table} SET {codec_col}=?, {blob_col}=? WHERE rowid=?", updates)
+        rewritten += len(updates)
+        last_rowid = rows[-1]["rowid"]
+    return rewritten, bytes_before, bytes_after
+
+
+def load_dictionaries(conn: sqlite3.Connection) -> list[int]:
+    ids = []
+    for r in conn.execute("SELECT id, zdict FROM compression_dict ORDER BY id"):
+        register_dictionary(r["id"], r["zdict"])
+        ids.append(r["id"])
+    return ids
+
+
+def load_dictionary(conn: sqlite3.Connection, dict_id: int) -> bytes | None:
+    row = conn.execute("SELECT zdict FROM compression_dict WHERE id = ?", (int(dict_id),)).fetchone()
+    return None if row is None else bytes(row[0])
+
+
+def sample_payloads(conn: sqlite3.Connection, limit: int = 2000) -> list[bytes]:
+    samples: list[bytes] = []
+    for table, (_, codec_col, blob_col) in BLOB_TABLES.items():
+        rows = conn.execute(
+            f"SELECT {codec_col} AS codec, {blob_col} AS blob FROM {table} "
+            f"WHERE {blob_col} IS NOT NULL ORDER BY rowid DESC LIMIT ?",
+            (limit,),
+        ).fetchall()
+        samples.extend(decode_bytes(r["codec"], r["blob"]) for r in reversed(rows))
+    return samples
+
+
+def train_and_store_dictionary(conn: sqlite3.Connection, sample_limit: int = 2000, size: int = 4096) -> int | None:
+    samples = sample_payloads(conn, sample_limit)
+    if not samples:
+        return None
+    zdict = train_dictionary(samples, size=size)
+    with transaction(conn):
+        cur = conn.execute(
+            "INSERT INTO compression_dict (created_at, sample_count, zdict) VALUES (datetime('now'), ?, ?)",
+            (len(samples), sqlite3.Binary(zdict)),
+        )
+    dict_id = int(cur.lastrowid)
+    register_dictionary(dict_id, zdict)
+    return dict_id
+
+
+def vacuum(conn: sqlite3.Connection) -> None:
+    conn.execute("VACUUM")
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+
+def compact(conn: sqlite3.Connection, codec: Codec, batch_size: int = 1000, force: bool = False) -> dict[str, tuple[int, int, int]]:
+    report = {table: recode_table(conn, table, codec, batch_size, force) for table in BLOB_TABLES}
+    vacuum(conn)
+    return report
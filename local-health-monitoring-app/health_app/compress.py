@@ -1,7 +1,11 @@
 from __future__ import annotations
 
 import json
+import re
 import zlib
+from collections import Counter
+from dataclasses import dataclass
+from typing import Callable, Iterable, Iterator
 
 
 def to_json_text(obj: dict) -> str:
@@ -24,3 +28,137 @@ def compress_json(obj: dict) -> tuple[str, bytes]:
 def decompress_json(blob: bytes) -> dict:
     return json.loads(decompress_text(blob))
 
+
+_dictionaries: dict[int, bytes] = {}
+_dictionary_loader: Callable[[int], bytes | None] | None = None
+
+
+def register_dictionary(dict_id: int, zdict: bytes) -> None:
+    _dictionaries[int(dict_id)] = bytes(zdict)
+
+
+def set_dictionary_loader(loader: Callable[[int], bytes | None] | None) -> None:
+    # Asked for ids this process has not seen, e.g. a dictionary that train_dict.py or another worker stored
+    # after startup. Dictionaries are never changed once stored, so a loaded one stays valid.
+    global _dictionary_loader
+    _dictionary_loader = loader
+
+
+def get_dictionary(dict_id: int) -> bytes:
+    dict_id = int(dict_id)
+    zdict = _dictionaries.get(dict_id)
+    if zdict is None and _dictionary_loader is not None:
+        loaded = _dictionary_loader(dict_id)
+        if loaded is not None:
+            register_dictionary(dict_id, loaded)
+            zdict = _dictionaries[dict_id]
+    if zdict is None:
+        raise LookupError(f"Compression dictionary {dict_id} is not loaded")
+    return zdict
+
+
+def latest_dictionary_id() -> int | None:
+    return max(_dictionaries) if _dictionaries else None
+
+
+_TOKEN_RE = re.compile(rb'"[^"]*":|"[^"]*"|-?\d+(?:\.\d+)?')
+
+
+def train_dictionary(samples: list[bytes], size: int = 4096) -> bytes:
+    counts: Counter[bytes] = Counter()
+    for sample in samples:
+        counts.update(set(_TOKEN_RE.findall(sample)))
+
+    picked: list[bytes] = []
+    used = 0
+    for token, n in counts.most_common():
+        if n < 2:
+            break
+        if used + len(token) > size // 2:
+            continue
+        picked.append(token)
+        used += len(token)
+
+    # zlib finds matches near the end of the dictionary cheapest, so the most
+    # common tokens go last, followed by whole recent samples for key order.
+    tail = b"".join(samples[-8:])[-(size - used):] if size > used else b""
+    return (b"".join(reversed(picked)) + tail)[-size:]
+
+
+@dataclass(frozen=True)
+class Codec:
+    name: str = "zlib"
+    level: int = 6
+    dict_id: int | None = None
+
+    @property
+    def tag(self) -> str:
+        if self.name == "zdict":
+            return f"zdict:{self.dict_id}"
+        return self.name
+
+    def encode(self, data: bytes) -> bytes:
+        if self.name == "raw":
+            return data
+        if self.name == "zlib":
+            return zlib.compress(data, level=self.level)
+        if self.name == "zdict":
+            c = zlib.compressobj(level=self.level, wbits=-15, zdict=get_dictionary(self.dict_id))
+            return c.compress(data) + c.flush()
+        raise ValueError(f"Unknown codec: {self.name}")
+
+
+def codec_from_spec(spec: str) -> Codec:
+    parts = (spec or "zlib").strip().lower().split(":")
+    name = parts[0]
+    if name == "raw":
+        return Codec("raw", level=0)
+    if name == "zlib":
+        return Codec("zlib", level=int(parts[1]) if len(parts) > 1 else 6)
+    if name == "zdict":
+        dict_id = latest_dictionary_id() if len(parts) < 2 or parts[1] in ("", "latest") else int(parts[1])
+        if dict_id is None:
+            raise LookupError("No compression dictionary has been trained yet")
+        return Codec("zdict", level=int(parts[2]) if len(parts) > 2 else 6, dict_id=dict_id)
+    raise ValueError(f"Unknown codec spec: {spec!r} (expected raw, zlib[:level] or zdict[:<id>|latest][:level])")
+
+
+_active_codec = Codec()
+
+
+def get_active_codec() -> Codec:
+    return _active_codec
+
+
+def set_active_codec(codec: Codec) -> None:
+    global _active_codec
+    _active_codec = codec
+
+
+def decode_bytes(tag: str, blob: bytes) -> bytes:
+    if tag == "raw":
+        return bytes(blob)
+    if tag == "zlib":
+        return zlib.decompress(blob)
+    if tag.startswith("zdict:"):
+        d = zlib.decompressobj(wbits=-15, zdict=get_dictionary(int(tag[6:])))
+        return d.decompress(blob) + d.flush()
+    raise ValueError(f"Unknown codec tag: {tag!r}")
+
+
+def encode_json(obj: dict, codec: Codec | None = None) -> tuple[str, bytes]:
+    codec = codec or _active_codec
+    return codec.tag, codec.encode(to_json_text(obj).encode("utf-8"))
+
+
+def decode_json(tag: str, blob: bytes) -> dict:
+    return json.loads(decode_bytes(tag, blob).decode("utf-8"))
+
+
+def gzip_stream(chunks: Iterable[str | bytes], level: int = 6) -> Iterator[bytes]:
+    c = zlib.compressobj(level=level, wbits=31)
+    for chunk in chunks:
+        out = c.compress(chunk.encode("utf-8") if isinstance(chunk, str) else chunk)
+        if out:
+            yield out
+    yield c.flush()
@@ -1,23 +1,152 @@
 from __future__ import annotations
 
+import os
 import sqlite3
+import threading
+import weakref
+from contextlib import contextmanager
 from pathlib import Path
+from typing import Iterator
 
 
-def connect(db_path: Path) -> sqlite3.Connection:
-    db_path.parent.mkdir(parents=True, exist_ok=True)
-    conn = sqlite3.connect(str(db_path))
+PRAGMAS: tuple[str, ...] = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-8000",
+    "PRAGMA mmap_size=67108864",
+    "PRAGMA busy_timeout=5000",
+)
+
+
+def _open(db_path: Path) -> sqlite3.Connection:
+    conn = sqlite3.connect(str(db_path), check_same_thread=False)
     conn.row_factory = sqlite3.Row
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
     return conn
 
 
+def connect(db_path: Path) -> sqlite3.Connection:
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    return _open(db_path)
+
+
+class _Holder:
+    # Kept only in the owning thread's threading.local, so it is dropped when that thread exits.
+    __slots__ = ("conn", "__weakref__")
+
+    def __init__(self, conn: sqlite3.Connection) -> None:
+        self.conn = conn
+
+
+class ConnectionPool:
+    def __init__(self, db_path: Path) -> None:
+        self.db_path = db_path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._conns: dict[sqlite3.Connection, weakref.finalize] = {}
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+
+    def connection(self) -> sqlite3.Connection:
+        holder = getattr(self._local, "holder", None)
+        if holder is None:
+            conn = _open(self.db_path)
+            holder = _Holder(conn)
+            # Servers that start a thread per request would otherwise leave one open connection per request.
+            with self._lock:
+                self._conns[conn] = weakref.finalize(holder, self._release, conn)
+            self._local.holder = holder
+        return holder.conn
+
+    def _release(self, conn: sqlite3.Connection) -> None:
+        with self._lock:
+            owned = self._conns.pop(conn, None) is not None
+        if owned:
+            conn.close()
+
+    @contextmanager
+    def session(self) -> Iterator[sqlite3.Connection]:
+        with transaction(self.connection()) as conn:
+            yield conn
+
+    def close_all(self) -> None:
+        with self._lock:
+            conns, self._conns = self._conns, {}
+        for conn, finalizer in conns.items():
+            finalizer.detach()
+            conn.close()
+        self._local = threading.local()
+
+
+_pools: dict[Path, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def _reset_pools_after_fork() -> None:
+    # A forked worker must not use (or finalize) SQLite connections opened by its parent,
+    # so keep them referenced and start every pool empty.
+    global _pools_lock
+    _pools_lock = threading.Lock()
+    for pool in _pools.values():
+        for finalizer in pool._conns.values():
+            finalizer.detach()
+        _inherited.extend(pool._conns)
+        pool._conns = {}
+        pool._lock = threading.Lock()
+        pool._local = threading.local()
+
+
+_inherited: list[sqlite3.Connection] = []
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_pools_after_fork)
+
+
+def get_pool(db_path: Path) -> ConnectionPool:
+    key = db_path.resolve()
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = ConnectionPool(key)
+            _pools[key] = pool
+        return pool
+
+
+@contextmanager
+def transaction(conn: sqlite3.Connection) -> Iterator[sqlite3.Connection]:
+    if conn.in_transaction:
+        yield conn
+        return
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+
+
 def ensure_db(db_path: Path) -> None:
+    from .compaction import load_dictionaries, load_dictionary
+    from .compress import set_dictionary_loader
+    from .migrations import SCHEMA_VERSION, has_schema, migrate, set_schema_version
+
     schema_path = Path(__file__).resolve().parent / "schema.sql"
-    with connect(db_path) as conn:
+    conn = connect(db_path)
+    try:
+        fresh = not has_schema(conn)
+        if not fresh:
+            migrate(conn)
         conn.executescript(schema_path.read_text(encoding="utf-8"))
+        if fresh:
+            set_schema_version(conn, SCHEMA_VERSION)
         conn.execute(
-            "INSERT OR IGNORE INTO medical_profile (id, updated_at, json_blob) VALUES (?, datetime('now'), ?)",
-            ("local", "{}"),
+            "INSERT OR IGNORE INTO medical_profile (user_id, updated_at, codec, blob) VALUES (?, datetime('now'), ?, ?)",
+            ("local", "raw", b"{}"),
         )
         conn.commit()
-
+        load_dictionaries(conn)
+    finally:
+        conn.close()
+    # Dictionaries stored later by another process are read on first use through this thread's pooled connection.
+    set_dictionary_loader(lambda dict_id: load_dictionary(get_pool(db_path).connection(), dict_id))
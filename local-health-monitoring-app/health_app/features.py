@@ -1,9 +1,10 @@
 from __future__ import annotations
 
 import math
-from typing import Any
+from typing import TYPE_CHECKING, Any
 
-import pandas as pd
+if TYPE_CHECKING:
+    import pandas as pd
 
 
 def bmi_from_profile(profile: dict) -> float | None:
@@ -41,17 +42,15 @@ def safe_int(x: Any) -> int | None:
 def compute_rolling_mean(series: pd.Series, window: int) -> float | None:
     if series is None or series.empty:
         return None
+    import pandas as pd
+
     s = pd.to_numeric(series, errors="coerce").dropna()
     if s.empty:
         return None
     return float(s.tail(window).mean())
 
 
-def build_feature_row(profile: dict, entry: dict, recent_entries: list[dict]) -> dict[str, float]:
-    df = pd.DataFrame(recent_entries) if recent_entries else pd.DataFrame()
-    if not df.empty and "entry_date" in df.columns:
-        df = df.sort_values("entry_date")
-
+def build_base_features(profile: dict, entry: dict) -> dict[str, float]:
     bmi = bmi_from_profile(profile)
 
     features: dict[str, float] = {}
@@ -93,6 +92,25 @@ def build_feature_row(profile: dict, entry: dict, recent_entries: list[dict]) ->
     if isinstance(symptoms, list):
         features["symptoms_count"] = float(len(symptoms))
 
+    return features
+
+
+def build_feature_row_rolling(profile: dict, entry: dict, rolling_means: dict[str, float]) -> dict[str, float]:
+    features = build_base_features(profile, entry)
+    features.update(rolling_means)
+    return features
+
+
+def build_feature_row(profile: dict, entry: dict, recent_entries: list[dict]) -> dict[str, float]:
+    # Reference implementation (the app uses build_feature_row_rolling); pandas loads on first call.
+    import pandas as pd
+
+    df = pd.DataFrame(recent_entries) if recent_entries else pd.DataFrame()
+    if not df.empty and "entry_date" in df.columns:
+        df = df.sort_values("entry_date")
+
+    features = build_base_features(profile, entry)
+
     if not df.empty:
         if "sleep_hours" in df.columns:
             m = compute_rolling_mean(df["sleep_hours"], 7)
@@ -108,4 +126,3 @@ def build_feature_row(profile: dict, entry: dict, recent_entries: list[dict]) ->
                 features["avg_hr_7d"] = m
 
     return features
-
@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import sqlite3
+
+import numpy as np
+
+from .compress import decode_json
+from .features import bmi_from_profile, safe_float
+from .rolling import DEFAULT_HORIZON, ROLLING_METRICS
+from .scoring import Scorer
+
+
+ENTRY_FEATURES: tuple[str, ...] = (
+    "steps",
+    "sleep_hours",
+    "heart_rate",
+    "calories",
+    "activity_minutes",
+    "sleep_quality",
+    "mood",
+    "stress",
+    "pain",
+)
+
+PROFILE_FALLBACK: tuple[str, ...] = ("bp_systolic", "bp_diastolic", "sugar_mg_dl")
+
+
+def load_history(
+    conn: sqlite3.Connection, user_id: str, with_symptoms: bool = False
+) -> tuple[list[str], list[str], dict[str, np.ndarray]]:
+    metrics = (*PROFILE_FALLBACK, *ENTRY_FEATURES)
+    extras = ", extras_codec, extras_blob" if with_symptoms else ""
+    rows = conn.execute(
+        f"SELECT id, entry_date, {', '.join(metrics)}{extras} FROM daily_entry WHERE user_id = ? ORDER BY entry_date, created_at",
+        (user_id,),
+    ).fetchall()
+    ids = [r[0] for r in rows]
+    dates = [r[1] for r in rows]
+    columns = {m: np.array([r[i + 2] for r in rows], dtype=np.float64) for i, m in enumerate(metrics)}
+    if with_symptoms:
+        counts = np.full(len(rows), np.nan)
+        for i, r in enumerate(rows):
+            if r["extras_blob"] is not None:
+                symptoms = decode_json(r["extras_codec"], r["extras_blob"]).get("symptoms")
+                if isinstance(symptoms, list):
+                    counts[i] = float(len(symptoms))
+        columns["symptoms_count"] = counts
+    return ids, dates, columns
+
+
+def entries_to_columns(entries: list[dict]) -> dict[str, np.ndarray]:
+    columns = {
+        m: np.array([safe_float(e.get(m)) for e in entries], dtype=np.float64)
+        for m in (*PROFILE_FALLBACK, *ENTRY_FEATURES)
+    }
+    columns["symptoms_count"] = np.array(
+        [float(len(e["symptoms"])) if isinstance(e.get("symptoms"), list) else np.nan for e in entries],
+        dtype=np.float64,
+    )
+    return columns
+
+
+def rolling_mean_column(values: np.ndarray, window: int, horizon: int = DEFAULT_HORIZON) -> np.ndarray:
+    # Mean of the last `window` non-null values among the last `horizon` rows, for every row at once.
+    n = len(values)
+    valid = ~np.isnan(values)
+    compact = values[valid]
+    seen = np.cumsum(valid)
+    before = np.concatenate([np.zeros(horizon, dtype=seen.dtype), seen])[:n]
+    k = np.minimum(window, seen - before)
+
+    offsets = np.arange(window - 1, -1, -1)
+    idx = seen[:, None] - 1 - offsets[None, :]
+    take = offsets[None, :] < k[:, None]
+    gathered = np.where(take, compact[np.clip(idx, 0, max(len(compact) - 1, 0))] if len(compact) else 0.0, 0.0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(k > 0, gathered.sum(axis=1) / k, np.nan)
+
+
+def build_feature_matrix(profile: dict, columns: dict[str, np.ndarray], features: list[str]) -> np.ndarray:
+    n = len(next(iter(columns.values()))) if columns else 0
+    X = np.zeros((n, len(features)), dtype=np.float32)
+
+    constants = {"age": safe_float(profile.get("age")), "bmi": bmi_from_profile(profile)}
+    rolling = {f"{prefix}_7d": metric for metric, prefix in ROLLING_METRICS.items()}
+    for j, f in enumerate(features):
+        if f in constants:
+            col = np.full(n, np.nan if constants[f] is None else constants[f])
+        elif f in PROFILE_FALLBACK:
+            col = columns[f].copy()
+            fallback = safe_float(profile.get(f))
+            # Mirrors `entry.get(k) or profile.get(k)`: a zero reading also falls back.
+            missing = np.isnan(col) | (col == 0)
+            col[missing] = np.nan if fallback is None else fallback
+        elif f in rolling:
+            col = rolling_mean_column(columns[rolling[f]], 7)
+        elif f in columns:
+            col = columns[f]
+        else:
+            continue
+        X[:, j] = np.nan_to_num(col, nan=0.0)
+    return X
+
+
+def score_history(conn: sqlite3.Connection, scorer: Scorer, profile: dict, user_id: str) -> list[dict]:
+    needs_symptoms = "symptoms_count" in scorer.selected_features
+    ids, dates, columns = load_history(conn, user_id, with_symptoms=needs_symptoms)
+    if not ids:
+        return []
+    X = build_feature_matrix(profile, columns, scorer.features)
+    risk = scorer.score_matrix(X)
+    return [{"entry_id": i, "entry_date": d, "risk": float(r)} for i, d, r in zip(ids, dates, risk)]
@@ -0,0 +1,177 @@
+from __future__ import annotations
+
+import csv
+import json
+import sqlite3
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from .compress import encode_json
+from .db import transaction
+from .features import build_feature_row_rolling
+from .repo import (
+    DEFAULT_USER,
+    ENTRY_COLUMNS,
+    ENTRY_INSERT,
+    ENTRY_SELECT,
+    bump_data_version,
+    coerce_metric,
+    entry_to_row,
+    get_profile,
+    list_recent_entries,
+    row_to_entry,
+)
+from .rolling import DEFAULT_HORIZON, RollingFeatureEngine, save_engine
+from .rollups import accumulate_rollups, merge_rollups
+from .utils import parse_date, parse_float, parse_int
+
+
+@dataclass
+class ImportResult:
+    rows: int = 0
+    skipped: int = 0
+    features: int = 0
+    seconds: float = 0.0
+    errors: list[str] = field(default_factory=list)
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.rows / self.seconds if self.seconds > 0 else 0.0
+
+
+def read_csv_rows(path: Path) -> Iterator[dict]:
+    with path.open("r", encoding="utf-8", newline="") as f:
+        yield from csv.DictReader(f)
+
+
+def read_ndjson_rows(path: Path) -> Iterator[dict]:
+    with path.open("r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def read_rows(path: Path, fmt: str | None = None) -> Iterator[dict]:
+    fmt = fmt or ("ndjson" if path.suffix.lower() in (".ndjson", ".jsonl") else "csv")
+    if fmt == "csv":
+        return read_csv_rows(path)
+    if fmt == "ndjson":
+        return read_ndjson_rows(path)
+    raise ValueError(f"Unknown import format: {fmt!r} (expected csv or ndjson)")
+
+
+def _text(value) -> str | None:
+    return None if value is None else str(value)
+
+
+def parse_entry(raw: dict) -> dict:
+    entry_date = parse_date(_text(raw.get("entry_date")))
+    if entry_date is None:
+        raise ValueError(f"invalid entry_date {raw.get('entry_date')!r}")
+    entry: dict = {"entry_date": entry_date}
+    for k, kind in ENTRY_COLUMNS.items():
+        text = _text(raw.get(k))
+        v = parse_int(text) if kind is int else None
+        if v is None:
+            v = coerce_metric(kind, parse_float(text))
+        if v is None and text is not None and text.strip() != "":
+            raise ValueError(f"invalid {k} {text!r}")
+        entry[k] = v
+    for k, v in raw.items():
+        if k not in entry and k not in ("id", "user_id", "created_at") and v is not None:
+            entry[k] = v.strip() if isinstance(v, str) else v
+    return entry
+
+
+def _backfill_features(conn: sqlite3.Connection, user_id: str, profile: dict, first: str, last: str) -> int:
+    # One pass in date order over [first, last]: the engine is primed with the entries just
+    # before `first`, then every entry without stored features gets them from the window at that point.
+    prior = conn.execute(
+        f"SELECT {ENTRY_SELECT} FROM daily_entry WHERE user_id=? AND entry_date < ? "
+        "ORDER BY entry_date DESC, created_at DESC LIMIT ?",
+        (user_id, first, DEFAULT_HORIZON),
+    ).fetchall()
+    engine = RollingFeatureEngine.from_entries(row_to_entry(r) for r in reversed(prior))
+
+    cur = conn.execute(
+        f"SELECT {ENTRY_SELECT}, "
+        "NOT EXISTS (SELECT 1 FROM daily_entry_features f WHERE f.entry_id = daily_entry.id) AS missing "
+        "FROM daily_entry WHERE user_id=? AND entry_date BETWEEN ? AND ? ORDER BY entry_date, created_at",
+        (user_id, first, last),
+    )
+    written = 0
+    batch: list[tuple] = []
+    for r in cur:
+        entry = row_to_entry(r)
+        engine.push(entry)
+        if not r["missing"]:
+            continue
+        codec, blob = encode_json(build_feature_row_rolling(profile, entry, engine.means()))
+        batch.append((entry["id"], user_id, entry["created_at"], codec, sqlite3.Binary(blob)))
+        if len(batch) >= 5000:
+            written += _insert_features(conn, batch)
+    return written + _insert_features(conn, batch)
+
+
+def _insert_features(conn: sqlite3.Connection, batch: list[tuple]) -> int:
+    conn.executemany(
+        "INSERT OR REPLACE INTO daily_entry_features (entry_id, user_id, created_at, codec, blob) VALUES (?, ?, ?, ?, ?)",
+        batch,
+    )
+    n = len(batch)
+    batch.clear()
+    return n
+
+
+def bulk_import(
+    conn: sqlite3.Connection,
+    rows: Iterable[dict],
+    user_id: str = DEFAULT_USER,
+    batch_size: int = 5000,
+    max_errors: int = 20,
+) -> ImportResult:
+    result = ImportResult()
+    t0 = time.perf_counter()
+    now = datetime.utcnow().isoformat(timespec="seconds")
+    first: str | None = None
+    last: str | None = None
+    rollups: dict = {}
+
+    with transaction(conn):
+        batch: list[tuple] = []
+        for line, raw in enumerate(rows, start=1):
+            try:
+                entry = parse_entry(raw)
+            except ValueError as e:
+                result.skipped += 1
+                if len(result.errors) < max_errors:
+                    result.errors.append(f"row {line}: {e}")
+                continue
+            stored = {"id": str(uuid.uuid4()), "created_at": now, **entry, "user_id": user_id}
+            batch.append(entry_to_row(stored))
+            accumulate_rollups(rollups, entry)
+            if first is None or entry["entry_date"] < first:
+                first = entry["entry_date"]
+            if last is None or entry["entry_date"] > last:
+                last = entry["entry_date"]
+            if len(batch) >= batch_size:
+                conn.executemany(ENTRY_INSERT, batch)
+                result.rows += len(batch)
+                batch.clear()
+        if batch:
+            conn.executemany(ENTRY_INSERT, batch)
+            result.rows += len(batch)
+
+        if result.rows:
+            result.features = _backfill_features(conn, user_id, get_profile(conn, user_id), first, last)
+            recent = list_recent_entries(conn, limit=DEFAULT_HORIZON, user_id=user_id)
+            save_engine(conn, RollingFeatureEngine.from_entries(reversed(recent)), user_id)
+            merge_rollups(conn, rollups, user_id)
+            bump_data_version(conn, user_id)
+
+    result.seconds = time.perf_counter() - t0
+    return result
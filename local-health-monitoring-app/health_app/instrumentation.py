@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+import cProfile
+import os
+import random
+import re
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator
+
+from flask import Flask, Response, g, request
+
+LATENCY_BUCKETS: tuple[float, ...] = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_spans: ContextVar[dict[str, float] | None] = ContextVar("health_spans", default=None)
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    spans = _spans.get()
+    if spans is None:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        spans[name] = spans.get(name, 0.0) + time.perf_counter() - t0
+
+
+class Histogram:
+    def __init__(self, buckets: tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+
+
+def _label_value(v: str) -> str:
+    return v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._help: dict[str, str] = {}
+        self._series: dict[str, dict[tuple[tuple[str, str], ...], Histogram]] = {}
+
+    def histogram(self, name: str, help_text: str) -> None:
+        self._help[name] = help_text
+        self._series.setdefault(name, {})
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series[name]
+            hist = series.get(key)
+            if hist is None:
+                hist = series[key] = Histogram()
+            hist.observe(value)
+
+    def render(self) -> str:
+        lines: list[str] = []
+        with self._lock:
+            for name, series in self._series.items():
+                lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} histogram")
+                for key, hist in series.items():
+                    labels = ",".join(f'{k}="{_label_value(v)}"' for k, v in key)
+                    sep = "," if labels else ""
+                    cumulative = 0
+                    for bound, count in zip((*hist.buckets, float("inf")), hist.counts):
+                        cumulative += count
+                        le = "+Inf" if bound == float("inf") else repr(bound)
+                        lines.append(f'{name}_bucket{{{labels}{sep}le="{le}"}} {cumulative}')
+                    lines.append(f"{name}_sum{{{labels}}} {hist.total!r}")
+                    lines.append(f"{name}_count{{{labels}}} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+
+@dataclass(frozen=True)
+class InstrumentationConfig:
+    metrics: bool = False
+    profile_slow_ms: float | None = None
+    profile_sample: float = 1.0
+    profile_dir: Path | None = None
+
+    @classmethod
+    def from_env(cls, instance_dir: Path) -> InstrumentationConfig:
+        slow = os.environ.get("HEALTH_PROFILE_SLOW_MS")
+        return cls(
+            metrics=os.environ.get("HEALTH_METRICS", "").lower() in ("1", "true", "yes"),
+            profile_slow_ms=float(slow) if slow else None,
+            profile_sample=float(os.environ.get("HEALTH_PROFILE_SAMPLE", "1.0")),
+            profile_dir=Path(os.environ.get("HEALTH_PROFILE_DIR") or instance_dir / "profiles"),
+        )
+
+
+def install_instrumentation(app: Flask, config: InstrumentationConfig) -> MetricsRegistry | None:
+    if not config.metrics and config.profile_slow_ms is None:
+        return None
+
+    metrics = MetricsRegistry()
+    metrics.histogram("health_request_duration_seconds", "Request latency by route.")
+    metrics.histogram("health_span_duration_seconds", "Time spent in each request stage by route.")
+    # cProfile cannot run in two threads at once, so at most one request is profiled at a time.
+    profiler_lock = threading.Lock()
+
+    @app.before_request
+    def start_timing():
+        g._instr_t0 = time.perf_counter()
+        g._instr_token = _spans.set({})
+        g._instr_profiler = None
+        if config.profile_slow_ms is not None and random.random() < config.profile_sample:
+            if profiler_lock.acquire(blocking=False):
+                g._instr_profiler = cProfile.Profile()
+                g._instr_profiler.enable()
+
+    @app.after_request
+    def finish_timing(response: Response) -> Response:
+        t0 = g.get("_instr_t0")
+        if t0 is None:
+            return response
+        elapsed = time.perf_counter() - t0
+        spans = _spans.get() or {}
+        route = request.url_rule.rule if request.url_rule is not None else "<unmatched>"
+
+        if config.metrics:
+            timings = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in spans.items()]
+            response.headers["Server-Timing"] = ", ".join([*timings, f"total;dur={elapsed * 1000:.2f}"])
+            metrics.observe(
+                "health_request_duration_seconds", elapsed, route=route, method=request.method, status=str(response.status_code)
+            )
+            for name, seconds in spans.items():
+                metrics.observe("health_span_duration_seconds", seconds, route=route, span=name)
+
+        profiler = g.pop("_instr_profiler", None)
+        if profiler is not None:
+            profiler.disable()
+            profiler_lock.release()
+            if elapsed * 1000 >= config.profile_slow_ms:
+                _dump_profile(profiler, config.profile_dir, request.endpoint or "unmatched", elapsed)
+        return response
+
+    @app.teardown_request
+    def reset_timing(exc: BaseException | None) -> None:
+        profiler = g.pop("_instr_profiler", None)
+        if profiler is not None:
+            profiler.disable()
+            profiler_lock.release()
+        token = g.pop("_instr_token", None)
+        if token is not None:
+            _spans.reset(token)
+
+    if config.metrics:
+
+        @app.get("/metrics")
+        def metrics_endpoint():
+            return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+    return metrics
+
+
+def _dump_profile(profiler: cProfile.Profile, profile_dir: Path, endpoint: str, elapsed: float) -> Path:
+    profile_dir.mkdir(parents=True, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%dT%H%M%S%f")
+    path = profile_dir / f"{stamp}-{re.sub(r'[^A-Za-z0-9_.-]', '_', endpoint)}-{elapsed * 1000:.0f}ms.prof"
+    profiler.dump_stats(path)
+    return path
@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+import json
+import multiprocessing
+import os
+import re
+import tempfile
+import threading
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable
+
+JOB_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+KEEP_JOBS = 100
+
+
+def _now() -> str:
+    return datetime.utcnow().isoformat(timespec="seconds")
+
+
+def _job_path(jobs_dir: Path, job_id: str) -> Path:
+    return jobs_dir / f"{job_id}.json"
+
+
+def read_job(jobs_dir: Path, job_id: str) -> dict | None:
+    if not JOB_ID_RE.match(job_id):
+        return None
+    try:
+        return json.loads(_job_path(jobs_dir, job_id).read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return None
+
+
+def write_job(jobs_dir: Path, status: dict) -> None:
+    # Replaced whole, so the server (another process) never reads a half-written status file.
+    jobs_dir.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=f".{status['id']}.", suffix=".tmp", dir=jobs_dir)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(status, f)
+        os.replace(tmp, _job_path(jobs_dir, status["id"]))
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
+
+def update_job(jobs_dir: Path, job_id: str, **changes: Any) -> dict:
+    status = read_job(jobs_dir, job_id) or {"id": job_id}
+    status.update(changes)
+    write_job(jobs_dir, status)
+    return status
+
+
+def prune_jobs(jobs_dir: Path, keep: int = KEEP_JOBS) -> int:
+    def mtime(path: Path) -> float:
+        try:
+            return path.stat().st_mtime
+        except FileNotFoundError:
+            return 0.0
+
+    old = sorted(jobs_dir.glob("*.json"), key=mtime, reverse=True)[keep:]
+    for path in old:
+        path.unlink(missing_ok=True)
+    return len(old)
+
+
+def _run_job(jobs_dir: Path, job_id: str, fn: Callable[..., dict], kwargs: dict) -> dict:
+    def progress(fraction: float, message: str) -> None:
+        update_job(jobs_dir, job_id, progress=round(fraction, 3), message=message)
+
+    update_job(jobs_dir, job_id, state="running", started_at=_now(), pid=os.getpid())
+    try:
+        result = fn(progress=progress, **kwargs)
+    except Exception as e:
+        update_job(jobs_dir, job_id, state="failed", message="Failed", error=f"{type(e).__name__}: {e}", finished_at=_now())
+        raise
+    update_job(jobs_dir, job_id, state="done", progress=1.0, message="Done", result=result, finished_at=_now())
+    return result
+
+
+def train_model_job(
+    progress: Callable[[float, str], None],
+    csv_path: str | None,
+    model_path: str,
+    k_best: int = 10,
+    streaming: bool = False,
+    db_path: str | None = None,
+    since: str | None = None,
+    until: str | None = None,
+    search: bool = False,
+) -> dict:
+    from .ml import concat_chunks, csv_chunks, feature_chunks, train_model_from_csv, train_model_from_frame, train_model_streaming
+
+    # With db_path the job trains on stored check-in features and their recorded outcomes instead of the CSV.
+    if search:
+        import pandas as pd
+
+        from .selection import select_model
+
+        progress(0.0, "Reading training data")
+        df = concat_chunks(feature_chunks(Path(db_path), since=since, until=until)) if db_path else pd.read_csv(csv_path)
+        bundle, results = select_model(df, Path(model_path), progress=progress)
+        candidates = [{"params": r.params, "metrics": r.metrics, "fit_seconds": r.fit_seconds} for r in results]
+        return {"selected_features": bundle.selected_features, "metrics": bundle.metrics, "params": bundle.params, "candidates": candidates}
+    if db_path is None and not streaming:
+        bundle = train_model_from_csv(Path(csv_path), Path(model_path), k_best=k_best, progress=progress)
+    else:
+        chunks = feature_chunks(Path(db_path), since=since, until=until) if db_path is not None else csv_chunks(Path(csv_path))
+        if streaming:
+            bundle = train_model_streaming(chunks, Path(model_path), k_best=k_best, progress=progress)
+        else:
+            progress(0.0, "Reading stored features")
+            bundle = train_model_from_frame(concat_chunks(chunks), Path(model_path), k_best=k_best, progress=progress)
+    return {"selected_features": bundle.selected_features, "metrics": bundle.metrics}
+
+
+class JobRunner:
+    def __init__(self, jobs_dir: Path, max_workers: int = 1) -> None:
+        self.jobs_dir = jobs_dir
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self._executor: ProcessPoolExecutor | None = None
+        self._active: dict[str, str] = {}
+
+    def _pool(self) -> ProcessPoolExecutor:
+        # Created on first use, i.e. inside the serving worker rather than before a preforking server forks.
+        # spawn starts children clean instead of copying the server's threads and SQLite connections.
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(self.max_workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    def active(self, kind: str) -> str | None:
+        with self._lock:
+            return self._active.get(kind)
+
+    def submit(self, kind: str, fn: Callable[..., dict], **kwargs: Any) -> tuple[str, bool]:
+        # At most one job of each kind per process; asking again returns the running job's id.
+        with self._lock:
+            job_id = self._active.get(kind)
+            if job_id is not None:
+                return job_id, False
+            job_id = uuid.uuid4().hex
+            write_job(
+                self.jobs_dir,
+                {"id": job_id, "kind": kind, "state": "queued", "progress": 0.0, "message": "Queued", "created_at": _now()},
+            )
+            try:
+                future = self._pool().submit(_run_job, self.jobs_dir, job_id, fn, kwargs)
+            except Exception as e:
+                update_job(self.jobs_dir, job_id, state="failed", message="Failed", error=f"{type(e).__name__}: {e}", finished_at=_now())
+                raise
+            self._active[kind] = job_id
+        future.add_done_callback(lambda f: self._finished(kind, job_id, f))
+        prune_jobs(self.jobs_dir)
+        return job_id, True
+
+    def _finished(self, kind: str, job_id: str, future: Future) -> None:
+        exc = future.exception()
+        with self._lock:
+            if self._active.get(kind) == job_id:
+                del self._active[kind]
+            if isinstance(exc, BrokenProcessPool):
+                self._executor = None
+        if exc is not None and (read_job(self.jobs_dir, job_id) or {}).get("state") != "failed":
+            # The child died before it could record the failure itself.
+            update_job(self.jobs_dir, job_id, state="failed", message="Failed", error=f"{type(exc).__name__}: {exc}", finished_at=_now())
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
@@ -0,0 +1,225 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+from typing import Callable
+
+from .compress import compress_json, decompress_json
+from .db import transaction
+from .features import safe_float
+
+
+BASELINE_VERSION = 1
+
+_V2_METRICS: dict[str, str] = {
+    "steps": "INTEGER",
+    "sleep_hours": "REAL",
+    "heart_rate": "INTEGER",
+    "calories": "INTEGER",
+    "activity_minutes": "INTEGER",
+    "sleep_quality": "INTEGER",
+    "mood": "INTEGER",
+    "stress": "INTEGER",
+    "pain": "INTEGER",
+    "bp_systolic": "INTEGER",
+    "bp_diastolic": "INTEGER",
+    "sugar_mg_dl": "REAL",
+}
+
+
+def _v2_metric(sql_type: str, value) -> int | float | None:
+    v = safe_float(value)
+    if v is None or v != v:
+        return None
+    if sql_type == "INTEGER" and v.is_integer():
+        return int(v)
+    return v
+
+
+def _v2_row(stored: dict) -> tuple:
+    base = ("id", "entry_date", "created_at")
+    extras = {k: v for k, v in stored.items() if k not in _V2_METRICS and k not in base}
+    extras_blob = sqlite3.Binary(compress_json(extras)[1]) if extras else None
+    return (
+        *(stored[k] for k in base),
+        *(_v2_metric(t, stored.get(k)) for k, t in _V2_METRICS.items()),
+        extras_blob,
+    )
+
+
+def _v2_columnar_entries(conn: sqlite3.Connection, batch_size: int) -> int:
+    conn.execute("ALTER TABLE daily_entry RENAME TO daily_entry_v1")
+    conn.execute("DROP INDEX IF EXISTS idx_daily_entry_date")
+    metric_cols = ",\n".join(f"  {k} {t}" for k, t in _V2_METRICS.items())
+    conn.execute(
+        "CREATE TABLE daily_entry (\n"
+        "  id TEXT PRIMARY KEY,\n"
+        "  entry_date TEXT NOT NULL,\n"
+        "  created_at TEXT NOT NULL,\n"
+        f"{metric_cols},\n"
+        "  extras_compressed BLOB\n"
+        ")"
+    )
+    placeholders = ", ".join("?" for _ in range(len(_V2_METRICS) + 4))
+    insert = f"INSERT INTO daily_entry VALUES ({placeholders})"
+
+    migrated = 0
+    cur = conn.execute("SELECT id, entry_date, created_at, json_blob, json_blob_compressed FROM daily_entry_v1")
+    while True:
+        rows = cur.fetchmany(batch_size)
+        if not rows:
+            break
+        batch = []
+        for r in rows:
+            if r["json_blob_compressed"] is not None:
+                stored = decompress_json(r["json_blob_compressed"])
+            else:
+                stored = json.loads(r["json_blob"] or "{}")
+            stored.update(id=r["id"], entry_date=r["entry_date"], created_at=r["created_at"])
+            batch.append(_v2_row(stored))
+        conn.executemany(insert, batch)
+        migrated += len(batch)
+
+    conn.execute("DROP TABLE daily_entry_v1")
+    return migrated
+
+
+def _v3_single_codec_blobs(conn: sqlite3.Connection, batch_size: int) -> int:
+    conn.execute("ALTER TABLE medical_profile RENAME TO medical_profile_v2")
+    conn.execute(
+        "CREATE TABLE medical_profile (id TEXT PRIMARY KEY, updated_at TEXT NOT NULL, codec TEXT NOT NULL, blob BLOB NOT NULL)"
+    )
+    conn.execute(
+        "INSERT INTO medical_profile (id, updated_at, codec, blob) "
+        "SELECT id, updated_at, "
+        "CASE WHEN json_blob_compressed IS NOT NULL THEN 'zlib' ELSE 'raw' END, "
+        "COALESCE(json_blob_compressed, CAST(json_blob AS BLOB)) FROM medical_profile_v2"
+    )
+    conn.execute("DROP TABLE medical_profile_v2")
+
+    conn.execute("ALTER TABLE daily_entry_features RENAME TO daily_entry_features_v2")
+    conn.execute("DROP INDEX IF EXISTS idx_daily_entry_features_created_at")
+    conn.execute(
+        "CREATE TABLE daily_entry_features (entry_id TEXT PRIMARY KEY, created_at TEXT NOT NULL, codec TEXT NOT NULL, blob BLOB NOT NULL)"
+    )
+    cur = conn.execute(
+        "INSERT INTO daily_entry_features (entry_id, created_at, codec, blob) "
+        "SELECT entry_id, created_at, "
+        "CASE WHEN features_json_compressed IS NOT NULL THEN 'zlib' ELSE 'raw' END, "
+        "COALESCE(features_json_compressed, CAST(features_json AS BLOB)) FROM daily_entry_features_v2"
+    )
+    migrated = cur.rowcount
+    conn.execute("DROP TABLE daily_entry_features_v2")
+
+    conn.execute("ALTER TABLE daily_entry RENAME COLUMN extras_compressed TO extras_blob")
+    conn.execute("ALTER TABLE daily_entry ADD COLUMN extras_codec TEXT")
+    conn.execute("UPDATE daily_entry SET extras_codec='zlib' WHERE extras_blob IS NOT NULL")
+    return migrated
+
+
+def _v4_entry_rollups(conn: sqlite3.Connection, batch_size: int) -> int:
+    conn.execute(
+        "CREATE TABLE entry_rollup (period TEXT NOT NULL, period_start TEXT NOT NULL, metric TEXT NOT NULL, "
+        "n INTEGER NOT NULL, total REAL NOT NULL, min_value REAL NOT NULL, max_value REAL NOT NULL, "
+        "PRIMARY KEY (period, period_start, metric)) WITHOUT ROWID"
+    )
+    periods = {
+        "week": "date(entry_date, '-6 days', 'weekday 1')",
+        "month": "date(entry_date, 'start of month')",
+    }
+    metrics = ("steps", "sleep_hours", "heart_rate", "bp_systolic", "bp_diastolic", "sugar_mg_dl")
+    selects = [
+        f"SELECT '{period}', {expr} AS period_start, '{m}', COUNT({m}), SUM({m}), MIN({m}), MAX({m}) "
+        f"FROM daily_entry WHERE {m} IS NOT NULL AND {expr} IS NOT NULL GROUP BY period_start"
+        for period, expr in periods.items()
+        for m in metrics
+    ]
+    cur = conn.execute("INSERT INTO entry_rollup " + " UNION ALL ".join(selects))
+    return cur.rowcount
+
+
+def _table_exists(conn: sqlite3.Connection, name: str) -> bool:
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (name,)).fetchone() is not None
+
+
+def _v5_user_scoped_tables(conn: sqlite3.Connection, batch_size: int) -> int:
+    conn.execute("ALTER TABLE medical_profile RENAME COLUMN id TO user_id")
+
+    conn.execute("ALTER TABLE daily_entry ADD COLUMN user_id TEXT NOT NULL DEFAULT 'local'")
+    conn.execute("DROP INDEX IF EXISTS idx_daily_entry_date")
+    conn.execute("ALTER TABLE daily_entry_features ADD COLUMN user_id TEXT NOT NULL DEFAULT 'local'")
+
+    conn.execute("ALTER TABLE entry_rollup RENAME TO entry_rollup_v4")
+    conn.execute(
+        "CREATE TABLE entry_rollup (user_id TEXT NOT NULL, period TEXT NOT NULL, period_start TEXT NOT NULL, "
+        "metric TEXT NOT NULL, n INTEGER NOT NULL, total REAL NOT NULL, min_value REAL NOT NULL, "
+        "max_value REAL NOT NULL, PRIMARY KEY (user_id, period, period_start, metric)) WITHOUT ROWID"
+    )
+    conn.execute(
+        "INSERT INTO entry_rollup SELECT 'local', period, period_start, metric, n, total, min_value, max_value "
+        "FROM entry_rollup_v4"
+    )
+    conn.execute("DROP TABLE entry_rollup_v4")
+
+    if _table_exists(conn, "rolling_state"):
+        conn.execute("ALTER TABLE rolling_state RENAME COLUMN id TO user_id")
+    return conn.execute("SELECT COUNT(*) FROM daily_entry").fetchone()[0]
+
+
+def _v6_data_version(conn: sqlite3.Connection, batch_size: int) -> int:
+    conn.execute("CREATE TABLE data_version (user_id TEXT PRIMARY KEY, version INTEGER NOT NULL) WITHOUT ROWID")
+    return 0
+
+
+def _v7_entry_outcomes(conn: sqlite3.Connection, batch_size: int) -> int:
+    conn.execute(
+        "CREATE TABLE entry_outcome (entry_id TEXT PRIMARY KEY, user_id TEXT NOT NULL, "
+        "label INTEGER NOT NULL CHECK (label IN (0, 1)), recorded_at TEXT NOT NULL)"
+    )
+    return 0
+
+
+def _v8_db_identity(conn: sqlite3.Connection, batch_size: int) -> int:
+    conn.execute("CREATE TABLE db_identity (id INTEGER PRIMARY KEY CHECK (id = 1), token TEXT NOT NULL)")
+    conn.execute("INSERT INTO db_identity (id, token) VALUES (1, lower(hex(randomblob(8))))")
+    return 0
+
+
+MIGRATIONS: dict[int, Callable[[sqlite3.Connection, int], int]] = {
+    2: _v2_columnar_entries,
+    3: _v3_single_codec_blobs,
+    4: _v4_entry_rollups,
+    5: _v5_user_scoped_tables,
+    6: _v6_data_version,
+    7: _v7_entry_outcomes,
+    8: _v8_db_identity,
+}
+
+SCHEMA_VERSION = max(MIGRATIONS)
+
+
+def has_schema(conn: sqlite3.Connection) -> bool:
+    row = conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='daily_entry'").fetchone()
+    return row is not None
+
+
+def schema_version(conn: sqlite3.Connection) -> int:
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version == 0 and has_schema(conn):
+        return BASELINE_VERSION
+    return version
+
+
+def set_schema_version(conn: sqlite3.Connection, version: int) -> None:
+    conn.execute(f"PRAGMA user_version={int(version)}")
+
+
+def migrate(conn: sqlite3.Connection, batch_size: int = 1000) -> list[tuple[int, int]]:
+    applied: list[tuple[int, int]] = []
+    current = schema_version(conn)
+    for version in sorted(v for v in MIGRATIONS if v > current):
+        with transaction(conn):
+            rows = MIGRATIONS[version](conn, batch_size)
+            set_schema_version(conn, version)
+        applied.append((version, rows))
+    return applied
@@ -1,15 +1,28 @@
 from __future__ import annotations
 
+import os
+import tempfile
+import threading
 from dataclasses import dataclass
+from datetime import datetime
 from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Iterable, Iterator
 
-import joblib
 import numpy as np
-import pandas as pd
-from sklearn.feature_selection import SelectKBest, f_classif
-from sklearn.linear_model import LogisticRegression
 
-from .features import build_feature_row
+from .compaction import load_dictionaries
+from .db import connect
+from .features import build_feature_row, build_feature_row_rolling
+from .repo import iter_labeled_features
+from .scoring import LinearScorer, Scorer, TreeScorer, load_scorer, row_to_vector, save_scorer, scorer_path
+
+# pandas, scikit-learn, SciPy and joblib are imported inside the functions that need them,
+# so serving requests with the exported NumPy scorer never loads them.
+if TYPE_CHECKING:
+    import pandas as pd
+    from sklearn.feature_selection import SelectKBest
+    from sklearn.linear_model import LogisticRegression, SGDClassifier
+    from sklearn.tree import DecisionTreeClassifier
 
 
 DEFAULT_FEATURES: list[str] = [
@@ -34,52 +47,206 @@ DEFAULT_FEATURES: list[str] = [
 ]
 
 
+Progress = Callable[[float, str], None]
+
+
+def no_progress(fraction: float, message: str) -> None:
+    pass
+
+
 @dataclass
 class ModelBundle:
     features: list[str]
     selected_features: list[str]
     selector: SelectKBest
-    model: LogisticRegression
+    model: LogisticRegression | SGDClassifier | DecisionTreeClassifier
+    metrics: dict[str, float] | None = None
+    params: dict[str, Any] | None = None
 
 
 def load_model_bundle(model_path: Path) -> ModelBundle | None:
     if not model_path.exists():
         return None
+    import joblib
+
     obj = joblib.load(model_path)
     return ModelBundle(
         features=obj["features"],
         selected_features=obj["selected_features"],
         selector=obj["selector"],
         model=obj["model"],
+        metrics=obj.get("metrics"),
+        params=obj.get("params"),
     )
 
 
-def _row_to_vector(features: list[str], row: dict) -> np.ndarray:
-    vec = []
-    for f in features:
-        v = row.get(f)
-        if v is None or (isinstance(v, float) and np.isnan(v)):
-            vec.append(0.0)
-        else:
-            vec.append(float(v))
-    return np.array(vec, dtype=np.float32)
+def export_scorer(bundle: ModelBundle) -> Scorer:
+    support = bundle.selector.get_support()
+    tree = getattr(bundle.model, "tree_", None)
+    if tree is not None:
+        # Positive-class probability at every node, from the per-node class distribution.
+        value = tree.value[:, 0, :]
+        positive = list(bundle.model.classes_).index(1)
+        return TreeScorer(
+            features=list(bundle.features),
+            selected_features=list(bundle.selected_features),
+            indices=np.flatnonzero(support).astype(np.intp),
+            left=tree.children_left.astype(np.intp),
+            right=tree.children_right.astype(np.intp),
+            feature=tree.feature.astype(np.intp),
+            threshold=tree.threshold.astype(np.float64),
+            proba=value[:, positive] / value.sum(axis=1),
+        )
+    return LinearScorer(
+        features=list(bundle.features),
+        selected_features=list(bundle.selected_features),
+        indices=np.flatnonzero(support).astype(np.intp),
+        coef=np.asarray(bundle.model.coef_, dtype=np.float64).ravel(),
+        intercept=float(np.asarray(bundle.model.intercept_).ravel()[0]),
+    )
+
+
+def ensure_scorer(model_path: Path) -> Scorer | None:
+    path = scorer_path(model_path)
+    if path.exists() or not model_path.exists():
+        return load_scorer(path)
+    bundle = load_model_bundle(model_path)
+    scorer = export_scorer(bundle)
+    save_scorer(scorer, path)
+    return scorer
+
+
+class ModelRegistry:
+    def __init__(self, model_path: Path, loader: Callable[[Path], Any] | None = None) -> None:
+        self.model_path = model_path
+        self.loader = loader or load_model_bundle
+        self._lock = threading.Lock()
+        self._bundle: Any = None
+        self._token: tuple[int, int] | None = None
+
+    def _stat_token(self) -> tuple[int, int] | None:
+        try:
+            st = self.model_path.stat()
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    @property
+    def version(self) -> str:
+        token = self._stat_token()
+        return "none" if token is None else f"{token[0]:x}-{token[1]:x}"
 
+    def get(self) -> Any:
+        token = self._stat_token()
+        if token == self._token:
+            return self._bundle
+        with self._lock:
+            if token != self._token:
+                # Swap the reference in one step; requests holding the old bundle keep using it.
+                self._bundle = self.loader(self.model_path) if token is not None else None
+                self._token = token
+            return self._bundle
 
-def train_model_from_csv(csv_path: Path, model_path: Path, k_best: int = 10) -> ModelBundle:
+
+def _atomic_dump(obj: dict, path: Path) -> None:
+    import joblib
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=path.parent)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            joblib.dump(obj, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
+
+def save_bundle(bundle: ModelBundle, model_path: Path) -> None:
+    _atomic_dump(
+        {
+            "features": bundle.features,
+            "selected_features": bundle.selected_features,
+            "selector": bundle.selector,
+            "model": bundle.model,
+            "metrics": bundle.metrics,
+            "params": bundle.params,
+        },
+        model_path,
+    )
+    # Written last: the app's registry watches this file, so the joblib bundle is already in place.
+    save_scorer(export_scorer(bundle), scorer_path(model_path))
+
+
+class MetricsAccumulator:
+    def __init__(self) -> None:
+        self.n = 0
+        self.correct = 0
+        self.log_loss = 0.0
+        self.brier = 0.0
+        self.positives = 0
+
+    def update(self, y: np.ndarray, p: np.ndarray) -> None:
+        p = np.clip(p.astype(np.float64), 1e-15, 1 - 1e-15)
+        self.n += len(y)
+        self.correct += int(np.sum((p >= 0.5) == (y == 1)))
+        self.log_loss += float(-np.sum(y * np.log(p) + (1 - y) * np.log(1 - p)))
+        self.brier += float(np.sum((p - y) ** 2))
+        self.positives += int(np.sum(y))
+
+    def result(self) -> dict[str, float]:
+        n = max(self.n, 1)
+        return {
+            "rows": float(self.n),
+            "accuracy": self.correct / n,
+            "log_loss": self.log_loss / n,
+            "brier": self.brier / n,
+            "positive_rate": self.positives / n,
+        }
+
+
+def train_model_from_csv(
+    csv_path: Path, model_path: Path, k_best: int = 10, progress: Progress = no_progress
+) -> ModelBundle:
+    import pandas as pd
+
+    progress(0.0, "Reading training data")
     df = pd.read_csv(csv_path)
     if "label" not in df.columns:
         raise ValueError("Training CSV must include a 'label' column")
+    return train_model_from_frame(df, model_path, k_best=k_best, progress=progress)
+
+
+def train_model_from_frame(
+    df: pd.DataFrame, model_path: Path, k_best: int = 10, progress: Progress = no_progress
+) -> ModelBundle:
+    from sklearn.feature_selection import SelectKBest, f_classif
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.preprocessing import StandardScaler
+
+    if df.empty:
+        raise ValueError("Training data is empty")
 
     features = [c for c in DEFAULT_FEATURES if c in df.columns]
+    held_out = holdout_mask(0, len(df))
+    test = df[held_out]
+    df = df[~held_out]
     X = df[features].fillna(0.0).astype(np.float32).to_numpy()
     y = df["label"].astype(int).to_numpy()
 
+    progress(0.2, "Selecting features")
     k = min(k_best, max(1, len(features)))
     selector = SelectKBest(score_func=f_classif, k=k)
     X_sel = selector.fit_transform(X, y)
 
+    progress(0.4, "Fitting model")
+    # Standardised like the streaming model, so C=1.0 is the same penalty in both modes.
+    scaler = StandardScaler().fit(X_sel)
     model = LogisticRegression(max_iter=500)
-    model.fit(X_sel, y)
+    model.fit(scaler.transform(X_sel), y)
+    _fold_scaling(model, scaler.mean_, scaler.scale_)
 
     support = selector.get_support()
     selected_features = [f for f, keep in zip(features, support) if keep]
@@ -90,23 +257,261 @@ def train_model_from_csv(csv_path: Path, model_path: Path, k_best: int = 10) ->
         selector=selector,
         model=model,
     )
+    progress(0.8, "Evaluating")
+    metrics = MetricsAccumulator()
+    X_test = test[features].fillna(0.0).to_numpy(np.float32)
+    metrics.update(test["label"].astype(int).to_numpy(), export_scorer(bundle).score_matrix(X_test))
+    bundle.metrics = metrics.result()
 
-    model_path.parent.mkdir(parents=True, exist_ok=True)
-    joblib.dump(
-        {
-            "features": bundle.features,
-            "selected_features": bundle.selected_features,
-            "selector": bundle.selector,
-            "model": bundle.model,
-        },
-        model_path,
+    progress(0.9, "Saving model")
+    save_bundle(bundle, model_path)
+    return bundle
+
+
+ChunkSource = Callable[[], Iterable["pd.DataFrame"]]
+
+# Every HOLDOUT_EVERY-th row is held out of training and scored instead, in both training modes.
+HOLDOUT_EVERY = 5
+
+
+def holdout_mask(start: int, n: int) -> np.ndarray:
+    # For rows start..start + n - 1 of the training data: True where the row is held out.
+    return np.arange(start, start + n) % HOLDOUT_EVERY == HOLDOUT_EVERY - 1
+
+
+def split_chunks(chunks: ChunkSource) -> tuple[ChunkSource, ChunkSource]:
+    # (training rows, held-out rows), both read from the same source; the split only depends on row position.
+    def part(held_out: bool) -> ChunkSource:
+        def read() -> Iterator[pd.DataFrame]:
+            start = 0
+            for df in chunks():
+                mask = holdout_mask(start, len(df))
+                start += len(df)
+                yield df[mask if held_out else ~mask]
+
+        return read
+
+    return part(False), part(True)
+
+
+def csv_chunks(csv_path: Path, chunksize: int = 50_000) -> ChunkSource:
+    import pandas as pd
+
+    header = pd.read_csv(csv_path, nrows=0).columns
+    if "label" not in header:
+        raise ValueError("Training CSV must include a 'label' column")
+    features = [c for c in DEFAULT_FEATURES if c in header]
+    dtypes: dict[str, Any] = {f: np.float32 for f in features}
+    dtypes["label"] = np.int8
+
+    def read() -> Iterator[pd.DataFrame]:
+        yield from pd.read_csv(csv_path, usecols=[*features, "label"], dtype=dtypes, chunksize=chunksize)
+
+    return read
+
+
+def feature_chunks(
+    db_path: Path,
+    since: str | None = None,
+    until: str | None = None,
+    user_id: str | None = None,
+    chunksize: int = 50_000,
+) -> ChunkSource:
+    # Feature rows saved at check-in time plus entry_outcome labels; nothing is recomputed.
+    # The upper bound is fixed here so every pass reads the same rows while new check-ins arrive.
+    until = until or datetime.utcnow().isoformat(timespec="seconds")
+
+    def read() -> Iterator[pd.DataFrame]:
+        import pandas as pd
+
+        conn = connect(db_path)
+        try:
+            load_dictionaries(conn)
+            for batch in iter_labeled_features(conn, until, since, user_id, batch_size=chunksize):
+                df = pd.DataFrame.from_records([row for row, _ in batch], columns=DEFAULT_FEATURES).astype(np.float32)
+                df["label"] = np.array([label for _, label in batch], dtype=np.int8)
+                yield df
+        finally:
+            conn.close()
+
+    return read
+
+
+def concat_chunks(chunks: ChunkSource) -> pd.DataFrame:
+    import pandas as pd
+
+    frames = list(chunks())
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=[*DEFAULT_FEATURES, "label"])
+
+
+class ClassStats:
+    def __init__(self, n_features: int) -> None:
+        self.count: dict[int, int] = {}
+        self.sums: dict[int, np.ndarray] = {}
+        self.sumsq = np.zeros(n_features, dtype=np.float64)
+        self.total = np.zeros(n_features, dtype=np.float64)
+
+    def update(self, X: np.ndarray, y: np.ndarray) -> None:
+        X = X.astype(np.float64)
+        self.total += X.sum(axis=0)
+        self.sumsq += np.square(X).sum(axis=0)
+        for label in np.unique(y):
+            rows = X[y == label]
+            label = int(label)
+            self.count[label] = self.count.get(label, 0) + len(rows)
+            self.sums[label] = self.sums.get(label, 0.0) + rows.sum(axis=0)
+
+    @property
+    def n(self) -> int:
+        return sum(self.count.values())
+
+    def mean(self) -> np.ndarray:
+        return self.total / max(self.n, 1)
+
+    def std(self) -> np.ndarray:
+        var = self.sumsq / max(self.n, 1) - np.square(self.mean())
+        return np.sqrt(np.maximum(var, 0.0))
+
+    def f_classif(self) -> tuple[np.ndarray, np.ndarray]:
+        # One-way ANOVA F from per-class sums, the same statistic sklearn's f_classif computes in memory.
+        from scipy import special
+
+        n, n_classes = self.n, len(self.count)
+        square_of_sums_all = np.square(self.total)
+        sstot = self.sumsq - square_of_sums_all / n
+        ssbn = sum(np.square(self.sums[c]) / self.count[c] for c in self.count) - square_of_sums_all / n
+        sswn = sstot - ssbn
+        dfbn, dfwn = n_classes - 1, n - n_classes
+        with np.errstate(divide="ignore", invalid="ignore"):
+            f = (ssbn / dfbn) / (sswn / dfwn)
+        return f, special.fdtrc(dfbn, dfwn, f)
+
+
+def _fold_scaling(model: LogisticRegression | SGDClassifier, mean: np.ndarray, scale: np.ndarray) -> None:
+    # Fold the standardisation into the weights so the model scores raw feature values.
+    coef = model.coef_ / scale
+    model.coef_ = coef
+    model.intercept_ = model.intercept_ - coef @ mean
+
+
+def _fitted_selector(scores: np.ndarray, pvalues: np.ndarray, k: int) -> SelectKBest:
+    from sklearn.feature_selection import SelectKBest, f_classif
+
+    selector = SelectKBest(score_func=f_classif, k=k)
+    selector.scores_ = scores
+    selector.pvalues_ = pvalues
+    selector.n_features_in_ = len(scores)
+    return selector
+
+
+def train_model_streaming(
+    chunks: ChunkSource,
+    model_path: Path,
+    k_best: int = 10,
+    epochs: int = 100,
+    random_state: int = 0,
+    progress: Progress = no_progress,
+    tol: float = 1e-4,
+    n_iter_no_change: int = 5,
+) -> ModelBundle:
+    progress(0.0, "Computing feature statistics")
+    chunks, held_out = split_chunks(chunks)
+    features: list[str] | None = None
+    stats: ClassStats | None = None
+    for df in chunks():
+        if features is None:
+            features = [c for c in DEFAULT_FEATURES if c in df.columns]
+            stats = ClassStats(len(features))
+        stats.update(df[features].fillna(0.0).to_numpy(np.float32), df["label"].to_numpy())
+    if features is None or stats is None or stats.n == 0:
+        raise ValueError("Training data is empty")
+    if len(stats.count) < 2:
+        raise ValueError("Training data must contain both label classes")
+
+    scores, pvalues = stats.f_classif()
+    k = min(k_best, max(1, len(features)))
+    selector = _fitted_selector(scores, pvalues, k)
+    idx = np.flatnonzero(selector.get_support())
+    selected_features = [features[i] for i in idx]
+
+    mean = stats.mean()[idx]
+    scale = stats.std()[idx]
+    scale[scale == 0] = 1.0
+
+    from sklearn.linear_model import SGDClassifier
+
+    # On the mean loss, alpha = 1 / (C * n) is the L2 penalty LogisticRegression(C=1.0) puts on the summed loss.
+    # Both modes fit standardised features, so they minimise the same objective.
+    model = SGDClassifier(
+        loss="log_loss",
+        alpha=1.0 / stats.n,
+        learning_rate="adaptive",
+        eta0=0.01,
+        average=True,
+        random_state=random_state,
+    )
+    from sklearn.metrics import log_loss
+
+    rng = np.random.default_rng(random_state)
+    classes = np.array(sorted(stats.count))
+    # epochs is an upper bound: like SGDClassifier.fit, stop once the pass loss has not improved by more than tol
+    # for n_iter_no_change passes. Each chunk is scored before the model trains on it, so this costs no extra read,
+    # but every pass reads the whole source again.
+    best_loss, stale = np.inf, 0
+    for epoch in range(epochs):
+        progress(0.1 + 0.7 * epoch / epochs, f"Training epoch {epoch + 1}")
+        pass_loss = 0.0
+        for df in chunks():
+            X = (df[selected_features].fillna(0.0).to_numpy(np.float64) - mean) / scale
+            y = df["label"].to_numpy()
+            if epoch:
+                pass_loss += log_loss(y, model.predict_proba(X), labels=classes, normalize=False)
+            order = rng.permutation(len(y))
+            model.partial_fit(X[order], y[order], classes=classes)
+        if epoch:
+            pass_loss /= stats.n
+            stale = stale + 1 if pass_loss > best_loss - tol else 0
+            best_loss = min(best_loss, pass_loss)
+            if stale >= n_iter_no_change:
+                break
+
+    _fold_scaling(model, mean, scale)
+
+    bundle = ModelBundle(
+        features=features,
+        selected_features=selected_features,
+        selector=selector,
+        model=model,
     )
+    progress(0.8, "Evaluating")
+    bundle.metrics = evaluate_scorer(held_out, export_scorer(bundle))
+    progress(0.9, "Saving model")
+    save_bundle(bundle, model_path)
     return bundle
 
 
-def predict_risk(bundle: ModelBundle, profile: dict, entry: dict, recent_entries: list[dict]) -> float:
-    row = build_feature_row(profile, entry, recent_entries)
-    x = _row_to_vector(bundle.features, row).reshape(1, -1)
+def evaluate_scorer(chunks: ChunkSource, scorer: Scorer) -> dict[str, float]:
+    metrics = MetricsAccumulator()
+    for df in chunks():
+        X = df.reindex(columns=scorer.features).fillna(0.0).to_numpy(np.float32)
+        metrics.update(df["label"].to_numpy(), scorer.score_matrix(X))
+    return metrics.result()
+
+
+def predict_risk(
+    bundle: ModelBundle | Scorer,
+    profile: dict,
+    entry: dict,
+    recent_entries: list[dict],
+    rolling_means: dict[str, float] | None = None,
+) -> float:
+    if rolling_means is not None:
+        row = build_feature_row_rolling(profile, entry, rolling_means)
+    else:
+        row = build_feature_row(profile, entry, recent_entries)
+    if isinstance(bundle, (LinearScorer, TreeScorer)):
+        return bundle.score_row(row)
+    x = row_to_vector(bundle.features, row).reshape(1, -1)
     x_sel = bundle.selector.transform(x)
     prob = float(bundle.model.predict_proba(x_sel)[0][1])
     return prob
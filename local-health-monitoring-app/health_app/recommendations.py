@@ -1,160 +1,249 @@
 from __future__ import annotations
 
-from .features import bmi_from_profile
-
-
-def classify_bmi(bmi: float | None) -> str | None:
-    if bmi is None:
-        return None
-    if bmi < 18.5:
-        return "underweight"
-    if bmi < 25.0:
-        return "normal"
-    if bmi < 30.0:
-        return "overweight"
-    return "obese"
-
-
-def classify_bp(sys: float | None, dia: float | None) -> str | None:
-    if sys is None or dia is None:
-        return None
-    if sys < 120 and dia < 80:
-        return "normal"
-    if 120 <= sys < 130 and dia < 80:
-        return "elevated"
-    if (130 <= sys < 140) or (80 <= dia < 90):
-        return "hypertension_stage_1"
-    if sys >= 140 or dia >= 90:
-        return "hypertension_stage_2"
-    return "unknown"
-
-
-def classify_sugar(sugar: float | None) -> str | None:
-    if sugar is None:
-        return None
-    if sugar < 100:
-        return "normal"
-    if sugar < 126:
-        return "prediabetes"
-    return "diabetes_range"
-
-
-def classify_activity(steps: int | None) -> str | None:
-    if steps is None:
-        return None
-    if steps < 5000:
-        return "low"
-    if steps < 8000:
-        return "moderate"
-    return "high"
-
-
-def build_recommendations(profile: dict, latest_entry: dict | None, model_score: float | None) -> list[dict]:
-    recos: list[dict] = []
-
-    bmi = bmi_from_profile(profile)
-    bmi_class = classify_bmi(bmi)
-    if bmi_class == "underweight":
-        recos.append(
-            {
-                "title": "Support healthy weight gain",
-                "priority": "medium",
-                "text": "Add nutrient-dense foods and consider strength training. If weight loss is unintentional, talk to a clinician.",
-                "rationale": "BMI suggests underweight.",
-            }
-        )
-    elif bmi_class == "overweight":
-        recos.append(
-            {
-                "title": "Aim for gradual weight improvement",
-                "priority": "medium",
-                "text": "Try consistent activity and reduce sugary drinks/ultra-processed snacks. Small weekly changes work best.",
-                "rationale": "BMI suggests overweight.",
-            }
-        )
-    elif bmi_class == "obese":
-        recos.append(
-            {
-                "title": "Prioritize sustainable lifestyle changes",
-                "priority": "high",
-                "text": "Focus on daily movement, balanced meals, and sleep. If possible, discuss a plan with a healthcare professional.",
-                "rationale": "BMI suggests obesity.",
-            }
-        )
-
-    bp_sys = latest_entry.get("bp_systolic") if latest_entry else profile.get("bp_systolic")
-    bp_dia = latest_entry.get("bp_diastolic") if latest_entry else profile.get("bp_diastolic")
-    bp_class = classify_bp(
-        float(bp_sys) if bp_sys is not None else None,
-        float(bp_dia) if bp_dia is not None else None,
-    )
-    if bp_class in {"elevated", "hypertension_stage_1", "hypertension_stage_2"}:
-        prio = "high" if bp_class == "hypertension_stage_2" else "medium"
-        recos.append(
-            {
-                "title": "Support healthy blood pressure",
-                "priority": prio,
-                "text": "Reduce excess salt, stay active, and limit alcohol. If readings are consistently high, talk to a clinician.",
-                "rationale": f"BP category: {bp_class.replace('_', ' ')}.",
-            }
-        )
-
-    sugar = latest_entry.get("sugar_mg_dl") if latest_entry else profile.get("sugar_mg_dl")
-    sugar_class = classify_sugar(float(sugar) if sugar is not None else None)
-    if sugar_class in {"prediabetes", "diabetes_range"}:
-        prio = "high" if sugar_class == "diabetes_range" else "medium"
-        recos.append(
-            {
-                "title": "Support healthy blood sugar",
-                "priority": prio,
-                "text": "Choose high-fiber meals, reduce sugary drinks, and add short walks after meals.",
-                "rationale": f"Sugar category: {sugar_class.replace('_', ' ')}.",
-            }
-        )
-
-    steps = None
-    if latest_entry is not None:
-        steps = latest_entry.get("steps")
-    activity_class = classify_activity(int(steps) if steps is not None else None)
-    if activity_class == "low":
-        recos.append(
-            {
-                "title": "Increase daily activity",
-                "priority": "medium",
-                "text": "Start with a 10–20 minute walk and build up. Try to move a little every hour.",
-                "rationale": "Recent steps suggest low activity.",
-            }
-        )
-
-    if model_score is not None:
-        if model_score >= 0.75:
-            recos.append(
-                {
-                    "title": "Higher risk signal detected",
-                    "priority": "high",
-                    "text": "Your recent summary signals look higher-risk. Consider reviewing BP/sugar readings and consult a clinician if concerned.",
-                    "rationale": f"Model risk score: {model_score:.2f}.",
-                }
-            )
-        elif model_score >= 0.5:
-            recos.append(
-                {
-                    "title": "Moderate risk signal detected",
-                    "priority": "medium",
-                    "text": "Focus on sleep, hydration, and steady activity. Re-check BP/sugar if you track them.",
-                    "rationale": f"Model risk score: {model_score:.2f}.",
-                }
-            )
-
-    if not recos:
-        recos.append(
-            {
-                "title": "Keep building consistent habits",
-                "priority": "low",
-                "text": "Log your daily check-ins and aim for balanced sleep, movement, and nutrition.",
-                "rationale": "Not enough signals yet to personalize strongly.",
-            }
-        )
-
-    return recos
+from typing import TYPE_CHECKING, Any, Callable, Mapping, Sequence
+
+import numpy as np
+
+from .rules import RECORD_FIELDS, Record, Rulebook, RuleGroup, default_rulebook
+
+if TYPE_CHECKING:
+    import pandas as pd
 
+
+def build_recommendations(
+    profile: dict, latest_entry: dict | None, model_score: float | None, rulebook: Rulebook | None = None
+) -> list[dict]:
+    # The thresholds and messages live in recommendation_rules.json; see rules.py for the format.
+    return (rulebook or default_rulebook()).evaluate(profile, latest_entry, model_score)
+
+
+# Batch variant: the same rules over whole columns. A missing value is None or NaN in the input frames.
+RECO_COLUMNS = RECORD_FIELDS
+
+
+def _render_ids(record: Record, values: np.ndarray, dynamic: dict[tuple[str, ...], int], base: int) -> np.ndarray:
+    # Variant ids for a templated record filled with each value, formatted exactly as the scalar path does.
+    # Number formatting is monotone, so over the sorted values each rendering covers one run: searching for the
+    # end of each run formats a handful of values per variant, and a value's run is the number of run starts it
+    # reaches. New renderings are numbered from base upwards.
+    ordered = np.sort(values)
+    fill, item, n = record.fill, ordered.item, len(ordered)
+    starts, ids = [], []
+    start, step = 0, 1
+    while start < n:
+        value = item(start)
+        filled = fill(value)
+        # Gallop from the last run's length to bound the end of this one, then bisect.
+        lo, hi = start + 1, min(n, start + step)
+        while hi < n and fill(item(hi)) == filled:
+            lo, step = hi + 1, step * 2
+            hi = min(n, start + step)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if fill(item(mid)) == filled:
+                lo = mid + 1
+            else:
+                hi = mid
+        starts.append(value)
+        ids.append(dynamic.setdefault(tuple(record.render(value).values()), base + len(dynamic)))
+        start, step = lo, lo - start
+    return np.array(ids, dtype=np.int32).take(_band(values, starts[1:], _int_dtype(len(starts))))
+
+
+def _cached(rulebook: Rulebook, key: Any, build: Callable[[], Any]) -> Any:
+    if key not in rulebook.batch_cache:
+        rulebook.batch_cache[key] = build()
+    return rulebook.batch_cache[key]
+
+
+def _cell_table(group: RuleGroup, records: list[Record]) -> tuple[np.ndarray, list[list[int]]]:
+    # table[w, cell] is the w-th record a cell emits, -1 past the end of its list; the extra last cell stands
+    # for a missing value. templated[w] lists the records in row w that need the value filled in.
+    width = max(map(len, group.cells), default=0)
+    table = np.full((width, len(group.cells) + 1), -1, dtype=np.int32)
+    for i, ids in enumerate(group.cells):
+        table[: len(ids), i] = ids
+    templated = [sorted({r for r in row.tolist() if r >= 0 and records[r].templated}) for row in table]
+    return table, templated
+
+
+def _column(df: pd.DataFrame | None, name: str, n: int) -> np.ndarray:
+    if df is None or name not in df.columns:
+        return np.full(n, np.nan)
+    col = df[name]
+    if col.dtype.kind not in "fiub":
+        import pandas as pd
+
+        col = pd.to_numeric(col, errors="coerce")
+    return col.to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+def _bmi_column(column: Callable[[str], np.ndarray]) -> np.ndarray:
+    weight, h_m = column("weight_kg"), column("height_cm") / 100.0
+    # NaN where the height is not positive: x * 0 / 0 is NaN for any x, and multiplying and dividing by the
+    # 0/1 mask is branch-free where np.where over an irregular mask is not.
+    positive = (h_m > 0).view(np.int8)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        bmi = weight / (h_m * h_m)
+        bmi *= positive
+        bmi /= positive
+    return bmi
+
+
+# Column versions of rules.DERIVED_METRICS.
+_DERIVED_COLUMNS: dict[str, Callable[[Callable[[str], np.ndarray]], np.ndarray]] = {"bmi": _bmi_column}
+
+
+def _int_dtype(limit: int) -> type:
+    # The smallest integer type holding -1..limit: small cells keep the blending arithmetic below cheap, and
+    # small variant ids and codes halve the gathers that build the output.
+    return np.int8 if limit < 127 else np.int16 if limit < 32767 else np.intp
+
+
+# Sets of renderings whose output codes a rulebook keeps; templated values differ from cohort to cohort.
+_MAX_CACHED_RENDERINGS = 32
+
+# Counting the edges a value reaches beats searchsorted, which pays a mispredicted branch per level on
+# unsorted values, up to a few hundred edges.
+_MAX_COUNTED_EDGES = 256
+
+
+def _band(value: np.ndarray, edges: Sequence[float], dtype: type) -> np.ndarray:
+    # bisect_right(edges, x) for every x as whole-column arithmetic; NaN is left to the caller.
+    if len(edges) > _MAX_COUNTED_EDGES:
+        return np.searchsorted(np.asarray(edges), value, side="right").astype(dtype)
+    band = np.zeros(len(value), dtype=dtype)
+    for edge in edges:
+        band += value >= edge
+    return band
+
+
+def _cells(group: RuleGroup, values: list[np.ndarray]) -> np.ndarray:
+    # The scalar bisect per metric, combined into a cell. Cell len(group.cells) marks a missing value.
+    ncells, dtype = len(group.cells), _int_dtype(len(group.cells))
+    cell = np.zeros(len(values[0]), dtype=dtype)
+    missing = np.zeros(len(values[0]), dtype=bool)
+    for value, edges, stride in zip(values, group.edges, group.strides):
+        band = _band(value, edges, dtype)
+        cell += band * stride if stride != 1 else band
+        missing |= np.isnan(value)
+    return cell + missing * (ncells - cell)
+
+
+def build_recommendations_batch(
+    profiles: pd.DataFrame | Mapping[str, Sequence[Any]],
+    latest: pd.DataFrame | Mapping[str, Sequence[Any]] | None = None,
+    model_scores: Sequence[float | None] | np.ndarray | None = None,
+    has_entry: Sequence[bool] | np.ndarray | None = None,
+    rulebook: Rulebook | None = None,
+) -> pd.DataFrame:
+    # Row i of `latest` and `model_scores` belongs to row i of `profiles`. has_entry says which rows have a
+    # latest entry; by default any row of `latest` with a non-missing value counts as one.
+    import pandas as pd
+
+    rulebook = rulebook or default_rulebook()
+    if not isinstance(profiles, pd.DataFrame):
+        profiles = pd.DataFrame(profiles)
+    if latest is not None and not isinstance(latest, pd.DataFrame):
+        latest = pd.DataFrame(latest)
+    n = len(profiles)
+    if has_entry is None:
+        entry = latest.notna().any(axis=1).to_numpy() if latest is not None else np.zeros(n, dtype=bool)
+    else:
+        entry = np.asarray(has_entry, dtype=bool)
+    entry = entry.view(np.int8)
+    scores = np.full(n, np.nan) if model_scores is None else np.asarray(model_scores, dtype=np.float64)
+
+    profile_cols: dict[str, np.ndarray] = {}
+    latest_cols: dict[str, np.ndarray] = {}
+
+    def profile_column(name: str) -> np.ndarray:
+        if name not in profile_cols:
+            derived = _DERIVED_COLUMNS.get(name)
+            profile_cols[name] = derived(profile_column) if derived is not None else _column(profiles, name, n)
+        return profile_cols[name]
+
+    def latest_column(name: str) -> np.ndarray:
+        if name not in latest_cols:
+            latest_cols[name] = _column(latest, name, n)
+        return latest_cols[name]
+
+    # Variant id per (row, slot), -1 where that slot has no recommendation. Slots follow the scalar output order:
+    # groups in rulebook order, then the records of a cell in rule order, then the fallback.
+    base = len(rulebook.records)
+    dynamic: dict[tuple[str, ...], int] = {}
+    slots: list[np.ndarray] = []
+    fired = np.zeros(n, dtype=bool)
+    for gi, group in enumerate(rulebook.groups):
+        table, templated = _cached(rulebook, ("cells", gi), lambda: _cell_table(group, rulebook.records))
+        if not len(table):
+            continue
+        ncells = len(group.cells)
+        if group.source == "model":
+            cell = _cells(group, [scores])
+        elif group.source == "profile":
+            cell = _cells(group, [profile_column(m) for m in group.metrics])
+        elif group.source == "latest":
+            latest_cell = _cells(group, [latest_column(m) for m in group.metrics])
+            cell = latest_cell + (1 - entry) * (ncells - latest_cell)
+        else:
+            # Classify both sources and blend the small integer cells arithmetically; np.where (or a boolean
+            # index) over an irregular mask costs far more than the comparisons themselves.
+            profile_cell = _cells(group, [profile_column(m) for m in group.metrics])
+            latest_cell = _cells(group, [latest_column(m) for m in group.metrics])
+            cell = profile_cell + entry * (latest_cell - profile_cell)
+
+        def values_at(rows: np.ndarray) -> np.ndarray:
+            # The single metric's value on rows that emitted a templated record (never missing there).
+            (metric,) = group.metrics
+            if group.source == "model":
+                return scores.take(rows)
+            if group.source == "profile":
+                return profile_column(metric).take(rows)
+            if group.source == "latest":
+                return latest_column(metric).take(rows)
+            return np.where(entry.take(rows), latest_column(metric).take(rows), profile_column(metric).take(rows))
+
+        for row, row_templated in zip(table, templated):
+            slot = row.take(cell)
+            for record_id in row_templated:
+                rows = np.flatnonzero(slot == record_id)
+                if len(rows):
+                    slot[rows] = _render_ids(rulebook.records[record_id], values_at(rows), dynamic, base)
+            fired |= slot >= 0
+            slots.append(slot)
+    if rulebook.fallback is not None:
+        slots.append(~fired * np.int32(rulebook.fallback + 1) - 1)
+    if not slots:
+        slots.append(np.full(n, -1, dtype=np.int32))
+
+    variants = [r.fields for r in rulebook.records] + list(dynamic)
+    width = len(slots)
+    flat = np.stack(slots, axis=1, dtype=_int_dtype(len(variants))).ravel()
+    slots.clear()
+    keep = np.flatnonzero(flat >= 0)
+    # Categorical columns, never a string per row: each column's codes per variant are worked out once per set of
+    # renderings, and the output gathers small integers. Templated records never reach the output themselves,
+    # only their renderings.
+    key = tuple(dynamic)
+    cache = rulebook.batch_cache.setdefault("codes", {})
+    if key not in cache:
+        if len(cache) >= _MAX_CACHED_RENDERINGS:
+            cache.clear()
+        columns = [pd.factorize(np.array([v[j] for v in variants], dtype=object)) for j in range(len(RECO_COLUMNS))]
+        codes = np.stack([c for c, _ in columns], axis=1, dtype=_int_dtype(max(len(t) for _, t in columns)))
+        cache[key] = codes, [pd.CategoricalDtype(t) for _, t in columns]
+    codes, dtypes = cache[key]
+    codes = codes.take(flat.take(keep), axis=0)
+    frame = {"row": np.floor_divide(keep, width, out=keep)}
+    for j, (col, dtype) in enumerate(zip(RECO_COLUMNS, dtypes)):
+        frame[col] = pd.Categorical.from_codes(codes[:, j], dtype=dtype, validate=False)
+    return pd.DataFrame(frame, copy=False)
+
+
+def group_recommendations(batch: pd.DataFrame, n_rows: int) -> list[list[dict]]:
+    # Back to one list of dicts per input row, the shape build_recommendations returns.
+    grouped: list[list[dict]] = [[] for _ in range(n_rows)]
+    for row, *values in batch[["row", *RECO_COLUMNS]].itertuples(index=False, name=None):
+        grouped[row].append(dict(zip(RECO_COLUMNS, values)))
+    return grouped
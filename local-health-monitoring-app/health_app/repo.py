@@ -1,98 +1,287 @@
 from __future__ import annotations
 
 import json
+import math
 import sqlite3
 import uuid
 from datetime import datetime
-from pathlib import Path
+from typing import TYPE_CHECKING, Iterator
 
-import pandas as pd
+from .compress import decode_json, encode_json
+from .db import transaction
+from .features import build_feature_row_rolling, safe_float
+from .rolling import DEFAULT_HORIZON, RollingFeatureEngine, load_engine, save_engine
+from .rollups import update_rollups
 
-from .compress import compress_json, decompress_json
-from .db import connect
-from .features import build_feature_row
+if TYPE_CHECKING:
+    import pandas as pd
 
 
-def get_profile(db_path: Path) -> dict:
-    with connect(db_path) as conn:
-        row = conn.execute("SELECT json_blob_compressed, json_blob FROM medical_profile WHERE id='local'").fetchone()
-        if row is None:
-            return {}
-        if row["json_blob_compressed"] is not None:
-            return decompress_json(row["json_blob_compressed"])
-        return json.loads(row["json_blob"] or "{}")
+DEFAULT_USER = "local"
 
+ENTRY_COLUMNS: dict[str, type] = {
+    "steps": int,
+    "sleep_hours": float,
+    "heart_rate": int,
+    "calories": int,
+    "activity_minutes": int,
+    "sleep_quality": int,
+    "mood": int,
+    "stress": int,
+    "pain": int,
+    "bp_systolic": int,
+    "bp_diastolic": int,
+    "sugar_mg_dl": float,
+}
 
-def save_profile(db_path: Path, profile: dict) -> None:
-    json_text, compressed = compress_json(profile)
-    with connect(db_path) as conn:
+_ENTRY_BASE = ("id", "user_id", "entry_date", "created_at")
+ENTRY_SELECT = ", ".join([*_ENTRY_BASE, *ENTRY_COLUMNS, "extras_codec", "extras_blob"])
+ENTRY_INSERT = (
+    f"INSERT INTO daily_entry ({ENTRY_SELECT}) "
+    f"VALUES ({', '.join('?' for _ in range(len(_ENTRY_BASE) + len(ENTRY_COLUMNS) + 2))})"
+)
+
+
+def coerce_metric(kind: type, value) -> int | float | None:
+    v = safe_float(value)
+    if v is None or math.isnan(v):
+        return None
+    if kind is int and v.is_integer():
+        return int(v)
+    return v
+
+
+def entry_to_row(stored: dict) -> tuple:
+    extras = {k: v for k, v in stored.items() if k not in ENTRY_COLUMNS and k not in _ENTRY_BASE}
+    codec, blob = encode_json(extras) if extras else (None, None)
+    return (
+        *(stored[k] for k in _ENTRY_BASE),
+        *(coerce_metric(kind, stored.get(k)) for k, kind in ENTRY_COLUMNS.items()),
+        codec,
+        sqlite3.Binary(blob) if blob is not None else None,
+    )
+
+
+def row_to_entry(row: sqlite3.Row) -> dict:
+    entry = {"id": row["id"], "user_id": row["user_id"], "created_at": row["created_at"], "entry_date": row["entry_date"]}
+    for k in ENTRY_COLUMNS:
+        entry[k] = row[k]
+    if row["extras_blob"] is not None:
+        entry.update(decode_json(row["extras_codec"], row["extras_blob"]))
+    return entry
+
+
+def get_profile(conn: sqlite3.Connection, user_id: str = DEFAULT_USER) -> dict:
+    row = conn.execute("SELECT codec, blob FROM medical_profile WHERE user_id=?", (user_id,)).fetchone()
+    if row is None:
+        return {}
+    return decode_json(row["codec"], row["blob"])
+
+
+def get_db_identity(conn: sqlite3.Connection) -> str:
+    row = conn.execute("SELECT token FROM db_identity WHERE id=1").fetchone()
+    return "" if row is None else row[0]
+
+
+def get_data_version(conn: sqlite3.Connection, user_id: str = DEFAULT_USER) -> int:
+    row = conn.execute("SELECT version FROM data_version WHERE user_id=?", (user_id,)).fetchone()
+    return 0 if row is None else row[0]
+
+
+def bump_data_version(conn: sqlite3.Connection, user_id: str = DEFAULT_USER) -> None:
+    # Call inside the write's transaction so readers never see new data under the old version.
+    conn.execute(
+        "INSERT INTO data_version (user_id, version) VALUES (?, 1) "
+        "ON CONFLICT(user_id) DO UPDATE SET version=version + 1",
+        (user_id,),
+    )
+
+
+def save_profile(conn: sqlite3.Connection, profile: dict, user_id: str = DEFAULT_USER) -> None:
+    codec, blob = encode_json(profile)
+    with transaction(conn):
         conn.execute(
-            "UPDATE medical_profile SET updated_at=datetime('now'), json_blob=?, json_blob_compressed=? WHERE id='local'",
-            (json_text, sqlite3.Binary(compressed)),
+            "INSERT INTO medical_profile (user_id, updated_at, codec, blob) VALUES (?, datetime('now'), ?, ?) "
+            "ON CONFLICT(user_id) DO UPDATE SET updated_at=excluded.updated_at, codec=excluded.codec, blob=excluded.blob",
+            (user_id, codec, sqlite3.Binary(blob)),
         )
-        conn.commit()
+        bump_data_version(conn, user_id)
 
 
-def list_recent_entries(db_path: Path, limit: int = 30) -> list[dict]:
-    with connect(db_path) as conn:
-        rows = conn.execute(
-            "SELECT json_blob_compressed, json_blob FROM daily_entry ORDER BY entry_date DESC, created_at DESC LIMIT ?",
-            (limit,),
-        ).fetchall()
+def list_users(conn: sqlite3.Connection) -> list[str]:
+    return [r[0] for r in conn.execute("SELECT user_id FROM medical_profile ORDER BY user_id")]
 
-    out: list[dict] = []
-    for r in rows:
-        if r["json_blob_compressed"] is not None:
-            out.append(decompress_json(r["json_blob_compressed"]))
-        else:
-            out.append(json.loads(r["json_blob"] or "{}"))
-    return out
 
+def list_recent_entries(conn: sqlite3.Connection, limit: int = 30, user_id: str = DEFAULT_USER) -> list[dict]:
+    rows = conn.execute(
+        f"SELECT {ENTRY_SELECT} FROM daily_entry WHERE user_id=? ORDER BY entry_date DESC, created_at DESC LIMIT ?",
+        (user_id, limit),
+    ).fetchall()
+    return [row_to_entry(r) for r in rows]
 
-def get_latest_entry(db_path: Path) -> dict | None:
-    items = list_recent_entries(db_path, limit=1)
+
+def get_latest_entry(conn: sqlite3.Connection, user_id: str = DEFAULT_USER) -> dict | None:
+    items = list_recent_entries(conn, limit=1, user_id=user_id)
     return items[0] if items else None
 
 
-def save_daily_entry(db_path: Path, entry: dict) -> tuple[bool, str]:
+def _merge_recent(recent: list[dict], stored: dict, limit: int) -> list[dict]:
+    merged = sorted(
+        [stored, *recent],
+        key=lambda e: (e.get("entry_date") or "", e.get("created_at") or ""),
+        reverse=True,
+    )
+    return merged[:limit]
+
+
+def save_daily_entry(conn: sqlite3.Connection, entry: dict, user_id: str = DEFAULT_USER) -> tuple[bool, str]:
     entry_date = (entry.get("entry_date") or "").strip()
     if entry_date == "":
         return False, "Please pick a date for the check-in."
 
     entry_id = str(uuid.uuid4())
     now = datetime.utcnow().isoformat(timespec="seconds")
-    stored = {"id": entry_id, "created_at": now, **entry}
-    json_text, compressed = compress_json(stored)
+    stored = {"id": entry_id, "created_at": now, **entry, "user_id": user_id, "entry_date": entry_date}
+    row = entry_to_row(stored)
+    metrics = row[len(_ENTRY_BASE) : len(_ENTRY_BASE) + len(ENTRY_COLUMNS)]
+    stored = {**stored, **dict(zip(ENTRY_COLUMNS, metrics))}
+
+    with transaction(conn):
+        profile = get_profile(conn, user_id)
+        engine = load_engine(conn, user_id)
+        if engine is not None and engine.accepts(stored):
+            engine.push(stored)
+        else:
+            # Back-dated check-in (or no saved state yet): rebuild the window from the table.
+            recent = list_recent_entries(conn, limit=DEFAULT_HORIZON, user_id=user_id)
+            recent = _merge_recent(recent, stored, limit=DEFAULT_HORIZON)
+            engine = RollingFeatureEngine.from_entries(reversed(recent))
+        features = build_feature_row_rolling(profile, stored, engine.means())
+        feat_codec, feat_blob = encode_json(features)
 
-    with connect(db_path) as conn:
+        conn.execute(ENTRY_INSERT, row)
         conn.execute(
-            "INSERT INTO daily_entry (id, entry_date, created_at, json_blob, json_blob_compressed) VALUES (?, ?, ?, ?, ?)",
-            (entry_id, entry_date, now, json_text, sqlite3.Binary(compressed)),
+            "INSERT OR REPLACE INTO daily_entry_features (entry_id, user_id, created_at, codec, blob) VALUES (?, ?, ?, ?, ?)",
+            (entry_id, user_id, now, feat_codec, sqlite3.Binary(feat_blob)),
         )
-        conn.commit()
+        update_rollups(conn, stored, user_id)
+        save_engine(conn, engine, user_id)
+        bump_data_version(conn, user_id)
+
+    return True, "ok"
 
-    profile = get_profile(db_path)
-    recent = list_recent_entries(db_path, limit=30)
-    features = build_feature_row(profile, stored, recent)
-    feat_json, feat_compressed = compress_json(features)
-    with connect(db_path) as conn:
+
+def iter_entries(
+    conn: sqlite3.Connection,
+    user_id: str = DEFAULT_USER,
+    start: str | None = None,
+    end: str | None = None,
+    batch_size: int = 500,
+) -> Iterator[list[dict]]:
+    where, params = ["user_id=?"], [user_id]
+    if start:
+        where.append("entry_date >= ?")
+        params.append(start)
+    if end:
+        where.append("entry_date <= ?")
+        params.append(end)
+    cur = conn.execute(
+        f"SELECT {ENTRY_SELECT} FROM daily_entry WHERE {' AND '.join(where)} ORDER BY entry_date DESC, created_at DESC",
+        params,
+    )
+    try:
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                break
+            yield [row_to_entry(r) for r in rows]
+    finally:
+        cur.close()
+
+
+def save_outcome(conn: sqlite3.Connection, entry_id: str, label: int, user_id: str = DEFAULT_USER) -> bool:
+    with transaction(conn):
+        if conn.execute("SELECT 1 FROM daily_entry WHERE id=? AND user_id=?", (entry_id, user_id)).fetchone() is None:
+            return False
         conn.execute(
-            "INSERT OR REPLACE INTO daily_entry_features (entry_id, created_at, features_json, features_json_compressed) VALUES (?, ?, ?, ?)",
-            (entry_id, now, feat_json, sqlite3.Binary(feat_compressed)),
+            "INSERT INTO entry_outcome (entry_id, user_id, label, recorded_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(entry_id) DO UPDATE SET label=excluded.label, recorded_at=excluded.recorded_at",
+            (entry_id, user_id, int(label), datetime.utcnow().isoformat(timespec="seconds")),
         )
-        conn.commit()
+    return True
 
-    return True, "ok"
+
+def iter_labeled_features(
+    conn: sqlite3.Connection,
+    until: str,
+    since: str | None = None,
+    user_id: str | None = None,
+    batch_size: int = 5000,
+) -> Iterator[list[tuple[dict, int]]]:
+    # Stored feature rows joined to their outcome label, oldest first, for created_at in [since, until).
+    where, params = ["f.created_at < ?"], [until]
+    if since:
+        where.append("f.created_at >= ?")
+        params.append(since)
+    if user_id:
+        where.append("f.user_id = ?")
+        params.append(user_id)
+    cur = conn.execute(
+        "SELECT f.codec, f.blob, o.label FROM daily_entry_features f JOIN entry_outcome o ON o.entry_id = f.entry_id "
+        f"WHERE {' AND '.join(where)} ORDER BY f.created_at",
+        params,
+    )
+    try:
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                break
+            yield [(decode_json(r["codec"], r["blob"]), r["label"]) for r in rows]
+    finally:
+        cur.close()
 
 
-def export_all_data(db_path: Path) -> str:
-    profile = get_profile(db_path)
-    entries = list_recent_entries(db_path, limit=3650)
-    payload = {"profile": profile, "entries": entries}
-    return json.dumps(payload, ensure_ascii=False, indent=2)
+EXPORT_FORMATS = ("json", "ndjson")
+
+
+def _dumps(obj: dict) -> str:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+def iter_export(
+    conn: sqlite3.Connection,
+    user_id: str = DEFAULT_USER,
+    fmt: str = "json",
+    start: str | None = None,
+    end: str | None = None,
+    batch_size: int = 500,
+) -> Iterator[str]:
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {fmt!r} (expected one of {', '.join(EXPORT_FORMATS)})")
+    profile = get_profile(conn, user_id)
+    batches = iter_entries(conn, user_id, start=start, end=end, batch_size=batch_size)
+
+    if fmt == "ndjson":
+        yield _dumps({"profile": profile}) + "\n"
+        for batch in batches:
+            yield "".join(_dumps(e) + "\n" for e in batch)
+        return
+
+    yield '{"profile":' + _dumps(profile) + ',"entries":['
+    sep = "\n"
+    for batch in batches:
+        yield sep + ",\n".join(_dumps(e) for e in batch)
+        sep = ",\n"
+    yield "\n]}\n"
+
+
+def export_all_data(conn: sqlite3.Connection, user_id: str = DEFAULT_USER) -> str:
+    return "".join(iter_export(conn, user_id))
 
 
 def entries_to_dataframe(entries: list[dict]) -> pd.DataFrame:
+    import pandas as pd
+
     if not entries:
         return pd.DataFrame()
 
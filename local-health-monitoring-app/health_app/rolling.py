@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import json
+import math
+import sqlite3
+from collections import deque
+from typing import Iterable
+
+from .features import safe_float
+
+
+ROLLING_METRICS: dict[str, str] = {
+    "sleep_hours": "avg_sleep",
+    "steps": "avg_steps",
+    "heart_rate": "avg_hr",
+}
+
+DEFAULT_WINDOWS: tuple[int, ...] = (7,)
+
+# build_feature_row only ever sees the 30 most recent entries, so a value
+# older than that drops out even if fewer than `window` readings remain.
+DEFAULT_HORIZON = 30
+
+
+class RollingWindow:
+    def __init__(self, size: int, horizon: int) -> None:
+        self.size = size
+        self.horizon = horizon
+        self.items: deque[tuple[int, float]] = deque()
+
+    def push(self, seq: int, value: float | None) -> None:
+        if value is not None:
+            self.items.append((seq, value))
+            if len(self.items) > self.size:
+                self.items.popleft()
+        while self.items and self.items[0][0] <= seq - self.horizon:
+            self.items.popleft()
+
+    def mean(self, size: int) -> float | None:
+        if not self.items:
+            return None
+        values = [v for _, v in self.items][-size:]
+        # Same left-to-right order as pandas' Series.mean, so the results match bit for bit.
+        return float(sum(values)) / len(values)
+
+
+class RollingFeatureEngine:
+    def __init__(self, windows: Iterable[int] = DEFAULT_WINDOWS, horizon: int = DEFAULT_HORIZON) -> None:
+        self.windows = tuple(sorted(set(windows)))
+        self.horizon = horizon
+        self.seq = 0
+        self.last_key: tuple[str, str] | None = None
+        self.metrics = {m: RollingWindow(max(self.windows), horizon) for m in ROLLING_METRICS}
+
+    @classmethod
+    def from_entries(cls, entries: Iterable[dict], **kwargs) -> RollingFeatureEngine:
+        engine = cls(**kwargs)
+        for e in entries:
+            engine.push(e)
+        return engine
+
+    @staticmethod
+    def entry_key(entry: dict) -> tuple[str, str]:
+        return (entry.get("entry_date") or "", entry.get("created_at") or "")
+
+    def accepts(self, entry: dict) -> bool:
+        return self.last_key is None or self.entry_key(entry) >= self.last_key
+
+    def push(self, entry: dict) -> None:
+        self.seq += 1
+        self.last_key = self.entry_key(entry)
+        for metric, window in self.metrics.items():
+            v = safe_float(entry.get(metric))
+            window.push(self.seq, None if v is None or math.isnan(v) else v)
+
+    def means(self) -> dict[str, float]:
+        out: dict[str, float] = {}
+        for metric, prefix in ROLLING_METRICS.items():
+            window = self.metrics[metric]
+            for size in self.windows:
+                m = window.mean(size)
+                if m is not None:
+                    out[f"{prefix}_{size}d"] = m
+        return out
+
+    def to_state(self) -> dict:
+        return {
+            "windows": list(self.windows),
+            "horizon": self.horizon,
+            "seq": self.seq,
+            "last_key": list(self.last_key) if self.last_key else None,
+            "metrics": {m: [list(item) for item in w.items] for m, w in self.metrics.items()},
+        }
+
+    @classmethod
+    def from_state(cls, state: dict) -> RollingFeatureEngine:
+        engine = cls(windows=state["windows"], horizon=state["horizon"])
+        engine.seq = state["seq"]
+        engine.last_key = tuple(state["last_key"]) if state["last_key"] else None
+        for m, items in state["metrics"].items():
+            if m in engine.metrics:
+                engine.metrics[m].items.extend((int(s), float(v)) for s, v in items)
+        return engine
+
+
+def load_engine(
+    conn: sqlite3.Connection,
+    user_id: str,
+    windows: Iterable[int] = DEFAULT_WINDOWS,
+    horizon: int = DEFAULT_HORIZON,
+) -> RollingFeatureEngine | None:
+    row = conn.execute("SELECT state FROM rolling_state WHERE user_id=?", (user_id,)).fetchone()
+    if row is None:
+        return None
+    state = json.loads(row["state"])
+    if tuple(state.get("windows", ())) != tuple(sorted(set(windows))) or state.get("horizon") != horizon:
+        return None
+    return RollingFeatureEngine.from_state(state)
+
+
+def save_engine(conn: sqlite3.Connection, engine: RollingFeatureEngine, user_id: str) -> None:
+    conn.execute(
+        "INSERT OR REPLACE INTO rolling_state (user_id, updated_at, state) VALUES (?, datetime('now'), ?)",
+        (user_id, json.dumps(engine.to_state(), separators=(",", ":"))),
+    )
@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import sqlite3
+from datetime import date, timedelta
+
+from .db import transaction
+
+
+ROLLUP_METRICS: tuple[str, ...] = (
+    "steps",
+    "sleep_hours",
+    "heart_rate",
+    "bp_systolic",
+    "bp_diastolic",
+    "sugar_mg_dl",
+)
+
+# SQL and Python must agree on period keys: Monday of the ISO week, first of the month.
+PERIOD_SQL: dict[str, str] = {
+    "week": "date(entry_date, '-6 days', 'weekday 1')",
+    "month": "date(entry_date, 'start of month')",
+}
+
+_UPSERT = (
+    "INSERT INTO entry_rollup (user_id, period, period_start, metric, n, total, min_value, max_value) "
+    "VALUES (?, ?, ?, ?, 1, ?, ?, ?) "
+    "ON CONFLICT(user_id, period, period_start, metric) DO UPDATE SET "
+    "n = n + 1, total = total + excluded.total, "
+    "min_value = min(min_value, excluded.min_value), max_value = max(max_value, excluded.max_value)"
+)
+
+
+def period_starts(entry_date: str) -> dict[str, str] | None:
+    if len(entry_date) != 10:
+        return None
+    try:
+        d = date.fromisoformat(entry_date)
+    except (TypeError, ValueError):
+        return None
+    return {
+        "week": (d - timedelta(days=d.weekday())).isoformat(),
+        "month": d.replace(day=1).isoformat(),
+    }
+
+
+_MERGE = (
+    "INSERT INTO entry_rollup (user_id, period, period_start, metric, n, total, min_value, max_value) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+    "ON CONFLICT(user_id, period, period_start, metric) DO UPDATE SET "
+    "n = n + excluded.n, total = total + excluded.total, "
+    "min_value = min(min_value, excluded.min_value), max_value = max(max_value, excluded.max_value)"
+)
+
+
+def accumulate_rollups(acc: dict[tuple[str, str, str], list], entry: dict) -> None:
+    starts = period_starts(entry.get("entry_date") or "")
+    if starts is None:
+        return
+    for metric in ROLLUP_METRICS:
+        v = entry.get(metric)
+        if v is None:
+            continue
+        for period, start in starts.items():
+            cell = acc.get((period, start, metric))
+            if cell is None:
+                acc[(period, start, metric)] = [1, v, v, v]
+            else:
+                cell[0] += 1
+                cell[1] += v
+                cell[2] = min(cell[2], v)
+                cell[3] = max(cell[3], v)
+
+
+def merge_rollups(conn: sqlite3.Connection, acc: dict[tuple[str, str, str], list], user_id: str) -> None:
+    conn.executemany(_MERGE, [(user_id, *key, *cell) for key, cell in acc.items()])
+
+
+def update_rollups(conn: sqlite3.Connection, entry: dict, user_id: str) -> None:
+    starts = period_starts(entry.get("entry_date") or "")
+    if starts is None:
+        return
+    params = []
+    for metric in ROLLUP_METRICS:
+        v = entry.get(metric)
+        if v is None:
+            continue
+        for period, start in starts.items():
+            params.append((user_id, period, start, metric, v, v, v))
+    if params:
+        conn.executemany(_UPSERT, params)
+
+
+def rebuild_rollups(conn: sqlite3.Connection, user_id: str | None = None) -> int:
+    where = "" if user_id is None else "user_id = ? AND "
+    selects = [
+        f"SELECT user_id, '{period}', {expr} AS period_start, '{metric}', "
+        f"COUNT({metric}), SUM({metric}), MIN({metric}), MAX({metric}) "
+        f"FROM daily_entry WHERE {where}{metric} IS NOT NULL AND {expr} IS NOT NULL GROUP BY user_id, period_start"
+        for period, expr in PERIOD_SQL.items()
+        for metric in ROLLUP_METRICS
+    ]
+    params = () if user_id is None else (user_id,) * len(selects)
+    with transaction(conn):
+        if user_id is None:
+            conn.execute("DELETE FROM entry_rollup")
+        else:
+            conn.execute("DELETE FROM entry_rollup WHERE user_id = ?", (user_id,))
+        cur = conn.execute(
+            "INSERT INTO entry_rollup (user_id, period, period_start, metric, n, total, min_value, max_value) "
+            + " UNION ALL ".join(selects),
+            params,
+        )
+    return cur.rowcount
+
+
+def list_rollups(conn: sqlite3.Connection, user_id: str, period: str, limit: int = 8) -> list[dict]:
+    rows = conn.execute(
+        "SELECT period_start, metric, n, total, min_value, max_value FROM entry_rollup "
+        "WHERE user_id = ? AND period = ? AND period_start IN "
+        "(SELECT DISTINCT period_start FROM entry_rollup WHERE user_id = ? AND period = ? "
+        "ORDER BY period_start DESC LIMIT ?) "
+        "ORDER BY period_start DESC",
+        (user_id, period, user_id, period, limit),
+    ).fetchall()
+
+    out: list[dict] = []
+    by_start: dict[str, dict] = {}
+    for r in rows:
+        item = by_start.get(r["period_start"])
+        if item is None:
+            item = {"period_start": r["period_start"], "metrics": {}}
+            by_start[r["period_start"]] = item
+            out.append(item)
+        item["metrics"][r["metric"]] = {
+            "mean": r["total"] / r["n"],
+            "min": r["min_value"],
+            "max": r["max_value"],
+            "count": r["n"],
+        }
+    return out
@@ -0,0 +1,290 @@
+from __future__ import annotations
+
+import json
+import math
+import string
+import threading
+from bisect import bisect_right
+from dataclasses import dataclass, field
+from functools import cached_property, lru_cache
+from itertools import product
+from pathlib import Path
+from typing import Any, Callable
+
+from .features import bmi_from_profile
+
+DEFAULT_RULES_PATH = Path(__file__).with_name("recommendation_rules.json")
+RULES_FORMAT = 1
+RECORD_FIELDS = ("title", "priority", "text", "rationale")
+PRIORITIES = ("low", "medium", "high")
+# "latest_or_profile" reads the latest check-in when there is one and the profile otherwise.
+SOURCES = ("profile", "latest", "latest_or_profile", "model")
+# Profile metrics that are computed rather than stored.
+DERIVED_METRICS: dict[str, Callable[[dict], float | None]] = {"bmi": bmi_from_profile}
+
+Reader = Callable[[dict, Any, Any], Any]
+
+
+class RuleError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class Record:
+    fields: tuple[str, ...]
+    # True when some field has a {value} placeholder, filled with the rule's metric value on output.
+    templated: bool = False
+
+    @cached_property
+    def _as_dict(self) -> dict[str, str]:
+        return dict(zip(RECORD_FIELDS, self.fields))
+
+    @cached_property
+    def _templates(self) -> tuple[tuple[str, str], ...]:
+        return tuple((k, v) for k, v in zip(RECORD_FIELDS, self.fields) if _placeholders(v, k))
+
+    def render(self, value: float | None = None) -> dict[str, str]:
+        out = self._as_dict.copy()
+        for k, template in self._templates:
+            out[k] = template.format(value=value)
+        return out
+
+    def fill(self, value: float | None) -> tuple[str, ...]:
+        # Only the templated fields: two values render the same record exactly when these match.
+        return tuple([template.format(value=value) for _, template in self._templates])
+
+
+@dataclass
+class RuleGroup:
+    # Every rule over the same source and metrics, merged: each metric's band edges are the union of the
+    # rules' edges, and cells[i] holds the records all those rules emit for merged cell i, where
+    # i = sum(bisect_right(edges[d], value[d]) * strides[d]).
+    source: str
+    metrics: tuple[str, ...]
+    edges: list[list[float]]
+    strides: list[int]
+    cells: list[tuple[int, ...]]
+    rule_ids: list[str]
+    readers: list[Reader] = field(default_factory=list, repr=False)
+    plan: list[tuple[Reader, list[float], int]] = field(init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        self.plan = list(zip(self.readers, self.edges, self.strides))
+
+
+@dataclass
+class Rulebook:
+    groups: list[RuleGroup]
+    records: list[Record]
+    fallback: int | None
+    rule_count: int
+    # Per-rulebook scratch space for build_recommendations_batch (lookup tables it derives once).
+    batch_cache: dict = field(default_factory=dict, repr=False, compare=False)
+
+    def evaluate(self, profile: dict, latest_entry: dict | None, model_score: float | None) -> list[dict]:
+        # One bisect per metric of each group: the cost depends on how many metrics the rules read,
+        # not on how many rules or bands there are.
+        out: list[dict] = []
+        records = self.records
+        for group in self.groups:
+            cell = 0
+            for read, edges, stride in group.plan:
+                value = read(profile, latest_entry, model_score)
+                if value is None:
+                    break
+                value = float(value)
+                if value != value:
+                    break
+                cell += bisect_right(edges, value) * stride
+            else:
+                for record_id in group.cells[cell]:
+                    out.append(records[record_id].render(value))
+        if not out and self.fallback is not None:
+            out.append(self.records[self.fallback].render())
+        return out
+
+
+def _reader(source: str, metric: str) -> Reader:
+    if source == "model":
+        return lambda profile, latest, score: score
+    if source == "profile":
+        derived = DERIVED_METRICS.get(metric)
+        if derived is not None:
+            return lambda profile, latest, score: derived(profile)
+        return lambda profile, latest, score: profile.get(metric)
+    if source == "latest":
+        return lambda profile, latest, score: latest.get(metric) if latest else None
+    return lambda profile, latest, score: (latest if latest else profile).get(metric)
+
+
+@dataclass
+class _Rule:
+    rule_id: str
+    edges: list[list[float]]
+    strides: list[int]
+    cells: list[int | None]
+
+
+def _placeholders(text: str, where: str) -> bool:
+    try:
+        names = [name for _, name, _, _ in string.Formatter().parse(text) if name is not None]
+        text.format(value=0.5)
+    except (ValueError, IndexError, KeyError) as e:
+        raise RuleError(f"{where}: bad placeholder in {text!r} ({e})") from e
+    if any(name != "value" for name in names):
+        raise RuleError(f"{where}: only {{value}} can be substituted, got {text!r}")
+    return bool(names)
+
+
+def _edges(raw: Any, where: str) -> list[float]:
+    if not isinstance(raw, list) or not all(isinstance(e, (int, float)) and not isinstance(e, bool) for e in raw):
+        raise RuleError(f"{where}: edges must be a list of numbers")
+    edges = [float(e) for e in raw]
+    if not all(math.isfinite(e) for e in edges) or any(a >= b for a, b in zip(edges, edges[1:])):
+        raise RuleError(f"{where}: edges must be finite and strictly increasing")
+    return edges
+
+
+def _flatten_bands(raw: Any, shape: list[int], where: str) -> list[str]:
+    if not shape:
+        if not isinstance(raw, str):
+            raise RuleError(f"{where}: band names must be strings")
+        return [raw]
+    if not isinstance(raw, list) or len(raw) != shape[0]:
+        raise RuleError(f"{where}: expected {shape[0]} bands (one more than the edges) at this level")
+    return [name for item in raw for name in _flatten_bands(item, shape[1:], where)]
+
+
+def compile_rules(spec: Any) -> Rulebook:
+    if not isinstance(spec, dict) or not isinstance(spec.get("rules"), list):
+        raise RuleError('A rulebook is a JSON object with a "rules" list')
+    if spec.get("version", RULES_FORMAT) != RULES_FORMAT:
+        raise RuleError(f"Unsupported rulebook version {spec.get('version')!r} (expected {RULES_FORMAT})")
+
+    record_ids: dict[Record, int] = {}
+
+    def add_record(raw: Any, where: str, allow_value: bool) -> int:
+        if not isinstance(raw, dict) or set(raw) != set(RECORD_FIELDS) or not all(isinstance(v, str) for v in raw.values()):
+            raise RuleError(f"{where}: a record needs exactly the string fields {', '.join(RECORD_FIELDS)}")
+        if raw["priority"] not in PRIORITIES:
+            raise RuleError(f"{where}: priority must be one of {', '.join(PRIORITIES)}")
+        templated = any([_placeholders(raw[k], where) for k in RECORD_FIELDS])
+        if templated and not allow_value:
+            raise RuleError(f"{where}: {{value}} is only available in single-metric rules")
+        record = Record(tuple(raw[k] for k in RECORD_FIELDS), templated)
+        return record_ids.setdefault(record, len(record_ids))
+
+    groups: dict[tuple[str, tuple[str, ...]], list[_Rule]] = {}
+    for i, raw in enumerate(spec["rules"]):
+        if not isinstance(raw, dict):
+            raise RuleError(f"rule {i}: must be an object")
+        rule_id = str(raw.get("id", i))
+        where = f"rule {rule_id}"
+        source = raw.get("source", "latest_or_profile")
+        if source not in SOURCES:
+            raise RuleError(f"{where}: source must be one of {', '.join(SOURCES)}")
+        metric = raw.get("metric")
+        metrics = (metric,) if isinstance(metric, str) else tuple(metric) if isinstance(metric, list) else ()
+        if not metrics or not all(isinstance(m, str) and m for m in metrics):
+            raise RuleError(f"{where}: metric must be a name or a list of names")
+        if source == "model" and metrics != ("model_score",):
+            raise RuleError(f'{where}: the model source has the single metric "model_score"')
+        raw_edges = [raw.get("edges")] if len(metrics) == 1 else raw.get("edges")
+        if not isinstance(raw_edges, list) or len(raw_edges) != len(metrics):
+            raise RuleError(f"{where}: give one list of edges per metric")
+        edges = [_edges(e, where) for e in raw_edges]
+        shape = [len(e) + 1 for e in edges]
+        bands = _flatten_bands(raw.get("bands"), shape, where)
+        band_records = raw.get("records", {})
+        if not isinstance(band_records, dict) or not set(band_records) <= set(bands):
+            raise RuleError(f"{where}: records must be keyed by band names used in bands")
+        ids = {name: add_record(rec, f"{where}, band {name}", len(metrics) == 1) for name, rec in band_records.items()}
+        strides = [math.prod(shape[d + 1 :]) for d in range(len(shape))]
+        groups.setdefault((source, metrics), []).append(_Rule(rule_id, edges, strides, [ids.get(b) for b in bands]))
+
+    compiled = []
+    for (source, metrics), rules in groups.items():
+        edges = [sorted({e for rule in rules for e in rule.edges[d]}) for d in range(len(metrics))]
+        shape = [len(e) + 1 for e in edges]
+        cells = []
+        for cell in product(*(range(n) for n in shape)):
+            emitted = []
+            for rule in rules:
+                # A merged band lies inside exactly one band of each rule; find it from the band's lower edge.
+                i = sum(
+                    (bisect_right(rule.edges[d], edges[d][b - 1]) if b else 0) * rule.strides[d] for d, b in enumerate(cell)
+                )
+                if rule.cells[i] is not None:
+                    emitted.append(rule.cells[i])
+            cells.append(tuple(emitted))
+        compiled.append(
+            RuleGroup(
+                source=source,
+                metrics=metrics,
+                edges=edges,
+                strides=[math.prod(shape[d + 1 :]) for d in range(len(shape))],
+                cells=cells,
+                rule_ids=[rule.rule_id for rule in rules],
+                readers=[_reader(source, m) for m in metrics],
+            )
+        )
+
+    fallback = None
+    if spec.get("fallback") is not None:
+        fallback = add_record(spec["fallback"], "fallback", allow_value=False)
+    return Rulebook(groups=compiled, records=list(record_ids), fallback=fallback, rule_count=len(spec["rules"]))
+
+
+def load_rulebook(path: Path) -> Rulebook:
+    try:
+        spec = json.loads(path.read_text(encoding="utf-8"))
+    except json.JSONDecodeError as e:
+        raise RuleError(f"{path}: {e}") from e
+    return compile_rules(spec)
+
+
+@lru_cache(maxsize=1)
+def default_rulebook() -> Rulebook:
+    return load_rulebook(DEFAULT_RULES_PATH)
+
+
+class RuleRegistry:
+    # Recompiles the rules file when it changes on disk, like ModelRegistry does for the model. An edit that
+    # does not load (say, a half-saved file) keeps the previous rulebook serving until the file is fixed.
+    def __init__(self, path: Path, on_error: Callable[[Exception], None] | None = None) -> None:
+        self.path = path
+        self.on_error = on_error
+        self.error: str | None = None
+        self._lock = threading.Lock()
+        self._rulebook: Rulebook | None = None
+        self._token: tuple[int, int] | None = None
+
+    def _stat_token(self) -> tuple[int, int] | None:
+        try:
+            st = self.path.stat()
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    @property
+    def version(self) -> str:
+        token = self._stat_token()
+        return "none" if token is None else f"{token[0]:x}-{token[1]:x}"
+
+    def get(self) -> Rulebook:
+        token = self._stat_token()
+        if token == self._token and self._rulebook is not None:
+            return self._rulebook
+        with self._lock:
+            if token != self._token or self._rulebook is None:
+                try:
+                    self._rulebook = load_rulebook(self.path)
+                    self.error = None
+                except (OSError, RuleError) as e:
+                    if self._rulebook is None:
+                        raise
+                    self.error = str(e)
+                    if self.on_error is not None:
+                        self.on_error(e)
+                self._token = token
+            return self._rulebook
@@ -1,25 +1,84 @@
 CREATE TABLE IF NOT EXISTS medical_profile (
-  id TEXT PRIMARY KEY,
+  user_id TEXT PRIMARY KEY,
   updated_at TEXT NOT NULL,
-  json_blob TEXT NOT NULL,
-  json_blob_compressed BLOB
+  codec TEXT NOT NULL,
+  blob BLOB NOT NULL
 );
 
 CREATE TABLE IF NOT EXISTS daily_entry (
   id TEXT PRIMARY KEY,
+  user_id TEXT NOT NULL DEFAULT 'local',
   entry_date TEXT NOT NULL,
   created_at TEXT NOT NULL,
-  json_blob TEXT NOT NULL,
-  json_blob_compressed BLOB
+  steps INTEGER,
+  sleep_hours REAL,
+  heart_rate INTEGER,
+  calories INTEGER,
+  activity_minutes INTEGER,
+  sleep_quality INTEGER,
+  mood INTEGER,
+  stress INTEGER,
+  pain INTEGER,
+  bp_systolic INTEGER,
+  bp_diastolic INTEGER,
+  sugar_mg_dl REAL,
+  extras_codec TEXT,
+  extras_blob BLOB
 );
 
-CREATE INDEX IF NOT EXISTS idx_daily_entry_date ON daily_entry(entry_date);
+CREATE INDEX IF NOT EXISTS idx_daily_entry_user_date ON daily_entry(user_id, entry_date, created_at);
 
 CREATE TABLE IF NOT EXISTS daily_entry_features (
   entry_id TEXT PRIMARY KEY,
+  user_id TEXT NOT NULL DEFAULT 'local',
   created_at TEXT NOT NULL,
-  features_json TEXT NOT NULL,
-  features_json_compressed BLOB
+  codec TEXT NOT NULL,
+  blob BLOB NOT NULL
 );
 
 CREATE INDEX IF NOT EXISTS idx_daily_entry_features_created_at ON daily_entry_features(created_at);
+CREATE INDEX IF NOT EXISTS idx_daily_entry_features_user ON daily_entry_features(user_id, created_at);
+
+CREATE TABLE IF NOT EXISTS compression_dict (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  created_at TEXT NOT NULL,
+  sample_count INTEGER NOT NULL,
+  zdict BLOB NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS entry_rollup (
+  user_id TEXT NOT NULL,
+  period TEXT NOT NULL,
+  period_start TEXT NOT NULL,
+  metric TEXT NOT NULL,
+  n INTEGER NOT NULL,
+  total REAL NOT NULL,
+  min_value REAL NOT NULL,
+  max_value REAL NOT NULL,
+  PRIMARY KEY (user_id, period, period_start, metric)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS rolling_state (
+  user_id TEXT PRIMARY KEY,
+  updated_at TEXT NOT NULL,
+  state TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS data_version (
+  user_id TEXT PRIMARY KEY,
+  version INTEGER NOT NULL
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS entry_outcome (
+  entry_id TEXT PRIMARY KEY,
+  user_id TEXT NOT NULL,
+  label INTEGER NOT NULL CHECK (label IN (0, 1)),
+  recorded_at TEXT NOT NULL
+);
+
+-- One random token per database file, so cache tags from a deleted and recreated DB never match the old one.
+CREATE TABLE IF NOT EXISTS db_identity (
+  id INTEGER PRIMARY KEY CHECK (id = 1),
+  token TEXT NOT NULL
+);
+INSERT OR IGNORE INTO db_identity (id, token) VALUES (1, lower(hex(randomblob(8))));
@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import os
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Union
+
+import numpy as np
+
+
+def row_to_vector(features: list[str], row: dict) -> np.ndarray:
+    vec = []
+    for f in features:
+        v = row.get(f)
+        if v is None or (isinstance(v, float) and np.isnan(v)):
+            vec.append(0.0)
+        else:
+            vec.append(float(v))
+    return np.array(vec, dtype=np.float32)
+
+
+def sigmoid(z: np.ndarray) -> np.ndarray:
+    # Split by sign so large |z| neither overflows exp nor loses precision.
+    out = np.empty_like(z, dtype=np.float64)
+    pos = z >= 0
+    out[pos] = 1.0 / (1.0 + np.exp(-z[pos]))
+    ez = np.exp(z[~pos])
+    out[~pos] = ez / (1.0 + ez)
+    return out
+
+
+@dataclass(frozen=True)
+class LinearScorer:
+    features: list[str]
+    selected_features: list[str]
+    indices: np.ndarray
+    coef: np.ndarray
+    intercept: float
+
+    def score_matrix(self, X: np.ndarray) -> np.ndarray:
+        z = X[:, self.indices].astype(np.float64) @ self.coef + self.intercept
+        return sigmoid(np.atleast_1d(z))
+
+    def score_row(self, row: dict) -> float:
+        x = row_to_vector(self.features, row).reshape(1, -1)
+        return float(self.score_matrix(x)[0])
+
+
+@dataclass(frozen=True)
+class TreeScorer:
+    features: list[str]
+    selected_features: list[str]
+    indices: np.ndarray
+    left: np.ndarray
+    right: np.ndarray
+    feature: np.ndarray
+    threshold: np.ndarray
+    proba: np.ndarray
+
+    def score_matrix(self, X: np.ndarray) -> np.ndarray:
+        # All rows descend together one level per step; sklearn compares float32 inputs against float64 thresholds.
+        Xs = np.atleast_2d(X[:, self.indices].astype(np.float32))
+        rows = np.arange(len(Xs))
+        node = np.zeros(len(Xs), dtype=np.intp)
+        active = self.left[node] >= 0
+        while active.any():
+            n = node[active]
+            go_left = Xs[rows[active], self.feature[n]] <= self.threshold[n]
+            node[active] = np.where(go_left, self.left[n], self.right[n])
+            active = self.left[node] >= 0
+        return self.proba[node]
+
+    def score_row(self, row: dict) -> float:
+        x = row_to_vector(self.features, row).reshape(1, -1)
+        return float(self.score_matrix(x)[0])
+
+
+Scorer = Union[LinearScorer, TreeScorer]
+
+
+def scorer_path(model_path: Path) -> Path:
+    return model_path.with_suffix(".npz")
+
+
+def save_scorer(scorer: Scorer, path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    arrays = {
+        "features": np.array(scorer.features, dtype=str),
+        "selected_features": np.array(scorer.selected_features, dtype=str),
+        "indices": scorer.indices.astype(np.int64),
+    }
+    if isinstance(scorer, TreeScorer):
+        arrays.update(
+            kind=np.array("tree"),
+            left=scorer.left.astype(np.int64),
+            right=scorer.right.astype(np.int64),
+            feature=scorer.feature.astype(np.int64),
+            threshold=scorer.threshold.astype(np.float64),
+            proba=scorer.proba.astype(np.float64),
+        )
+    else:
+        arrays.update(
+            kind=np.array("linear"),
+            coef=scorer.coef.astype(np.float64),
+            intercept=np.array(scorer.intercept, dtype=np.float64),
+        )
+    fd, tmp = tempfile.mkstemp(prefix=f".{path.stem}.", suffix=".npz", dir=path.parent)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, **arrays)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
+
+def load_scorer(path: Path) -> Scorer | None:
+    if not path.exists():
+        return None
+    with np.load(path, allow_pickle=False) as data:
+        if str(data["kind"]) == "tree":
+            return TreeScorer(
+                features=[str(f) for f in data["features"]],
+                selected_features=[str(f) for f in data["selected_features"]],
+                indices=data["indices"].astype(np.intp),
+                left=data["left"].astype(np.intp),
+                right=data["right"].astype(np.intp),
+                feature=data["feature"].astype(np.intp),
+                threshold=data["threshold"].astype(np.float64),
+                proba=data["proba"].astype(np.float64),
+            )
+        return LinearScorer(
+            features=[str(f) for f in data["features"]],
+            selected_features=[str(f) for f in data["selected_features"]],
+            indices=data["indices"].astype(np.intp),
+            coef=data["coef"].astype(np.float64),
+            intercept=float(data["intercept"]),
+        )
@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+import time
+import warnings
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+import numpy as np
+
+from .ml import DEFAULT_FEATURES, MetricsAccumulator, ModelBundle, Progress, no_progress, save_bundle
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+DEFAULT_K: tuple[int, ...] = (4, 6, 8, 10, 14, 18)
+DEFAULT_C: tuple[float, ...] = (0.01, 0.1, 1.0, 10.0)
+DEFAULT_DEPTHS: tuple[int, ...] = (2, 3, 4, 6)
+
+
+@dataclass
+class CandidateResult:
+    params: dict[str, Any]
+    metrics: dict[str, float]
+    fit_seconds: float = 0.0
+    fold_seconds: list[float] = field(default_factory=list)
+
+
+def candidate_grid(
+    n_features: int,
+    ks: tuple[int, ...] = DEFAULT_K,
+    cs: tuple[float, ...] = DEFAULT_C,
+    depths: tuple[int, ...] = DEFAULT_DEPTHS,
+) -> list[dict[str, Any]]:
+    ks = sorted({min(k, n_features) for k in ks if k > 0})
+    grid = [{"model": "logreg", "k": k, "C": c} for k in ks for c in cs]
+    grid += [{"model": "tree", "k": k, "max_depth": d} for k in ks for d in depths]
+    return grid
+
+
+def _make_model(params: dict[str, Any], random_state: int):
+    if params["model"] == "tree":
+        from sklearn.tree import DecisionTreeClassifier
+
+        return DecisionTreeClassifier(max_depth=params["max_depth"], random_state=random_state)
+    from sklearn.linear_model import LogisticRegression
+
+    return LogisticRegression(C=params["C"], max_iter=500)
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    # Same ranking as SelectKBest: NaN scores sort lowest, stable order among ties.
+    scores = np.where(np.isnan(scores), np.finfo(scores.dtype).min, scores)
+    return np.sort(np.argsort(scores, kind="mergesort")[-k:])
+
+
+def fold_matrices(
+    X: np.ndarray, y: np.ndarray, folds: int, ks: list[int], random_state: int = 0
+) -> dict[tuple[int, int], tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]]:
+    # F-scores are computed once per fold and the selected-column matrices once per (fold, k);
+    # every C / depth / model family reuses them. joblib memory-maps the large ones for the workers.
+    from sklearn.feature_selection import f_classif
+    from sklearn.model_selection import StratifiedKFold
+
+    cache = {}
+    splitter = StratifiedKFold(folds, shuffle=True, random_state=random_state)
+    for i, (train, test) in enumerate(splitter.split(X, y)):
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            scores, _ = f_classif(X[train], y[train])
+        for k in ks:
+            idx = _top_k(scores, k)
+            cache[(i, k)] = (X[np.ix_(train, idx)], y[train], X[np.ix_(test, idx)], y[test])
+    return cache
+
+
+def _fit_fold(task: int, params: dict[str, Any], X_train, y_train, X_test, random_state: int) -> tuple[int, np.ndarray, float]:
+    t0 = time.perf_counter()
+    model = _make_model(params, random_state).fit(X_train, y_train)
+    p = model.predict_proba(X_test)[:, list(model.classes_).index(1)]
+    return task, p, time.perf_counter() - t0
+
+
+def select_model(
+    df: pd.DataFrame,
+    model_path: Path,
+    candidates: list[dict[str, Any]] | None = None,
+    folds: int = 5,
+    n_jobs: int = -1,
+    random_state: int = 0,
+    progress: Progress = no_progress,
+) -> tuple[ModelBundle, list[CandidateResult]]:
+    from joblib import Parallel, delayed
+    from sklearn.feature_selection import SelectKBest, f_classif
+
+    if df.empty:
+        raise ValueError("Training data is empty")
+    features = [c for c in DEFAULT_FEATURES if c in df.columns]
+    X = df[features].fillna(0.0).astype(np.float32).to_numpy()
+    y = df["label"].astype(int).to_numpy()
+    counts = np.bincount(y, minlength=2)
+    folds = min(folds, int(counts.min()))
+    if folds < 2:
+        raise ValueError("Cross-validation needs at least 2 examples of each label")
+
+    candidates = candidates or candidate_grid(len(features))
+    progress(0.05, "Caching fold matrices")
+    cache = fold_matrices(X, y, folds, sorted({c["k"] for c in candidates}), random_state)
+
+    tasks = [(c, f) for c in range(len(candidates)) for f in range(folds)]
+    progress(0.1, f"Cross-validating {len(candidates)} candidates x {folds} folds")
+    results = [CandidateResult(params=c, metrics={}, fold_seconds=[0.0] * folds) for c in candidates]
+    accumulators = [MetricsAccumulator() for _ in candidates]
+    parallel = Parallel(n_jobs=n_jobs, return_as="generator_unordered")
+    jobs = (
+        delayed(_fit_fold)(t, candidates[c], *cache[(f, candidates[c]["k"])][:3], random_state)
+        for t, (c, f) in enumerate(tasks)
+    )
+    for done, (t, p, seconds) in enumerate(parallel(jobs), start=1):
+        c, f = tasks[t]
+        accumulators[c].update(cache[(f, candidates[c]["k"])][3], p)
+        results[c].fold_seconds[f] = seconds
+        if done % folds == 0:
+            progress(0.1 + 0.8 * done / len(tasks), f"{done}/{len(tasks)} folds done")
+    for result, acc in zip(results, accumulators):
+        result.metrics = acc.result()
+        result.fit_seconds = sum(result.fold_seconds)
+
+    # Lowest out-of-fold log loss wins; accuracy, then grid order, break ties.
+    ranked = sorted(range(len(results)), key=lambda i: (results[i].metrics["log_loss"], -results[i].metrics["accuracy"], i))
+    best = results[ranked[0]]
+
+    progress(0.9, "Refitting best candidate")
+    selector = SelectKBest(score_func=f_classif, k=best.params["k"])
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        X_sel = selector.fit_transform(X, y)
+    model = _make_model(best.params, random_state).fit(X_sel, y)
+    bundle = ModelBundle(
+        features=features,
+        selected_features=[f for f, keep in zip(features, selector.get_support()) if keep],
+        selector=selector,
+        model=model,
+        metrics={**best.metrics, "cv_folds": float(folds)},
+        params=dict(best.params),
+    )
+    save_bundle(bundle, model_path)
+    return bundle, [results[i] for i in ranked]
@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+from datetime import date, datetime, timezone
+
 
 def parse_int(value: str | None) -> int | None:
     if value is None:
@@ -24,3 +26,34 @@ def parse_float(value: str | None) -> float | None:
     except ValueError:
         return None
 
+
+def parse_date(value: str | None) -> str | None:
+    if value is None:
+        return None
+    v = value.strip()
+    if v == "":
+        return None
+    try:
+        return date.fromisoformat(v).isoformat()
+    except ValueError:
+        return None
+
+
+def parse_timestamp(value: str | None) -> str | None:
+    # Normalised to the stored created_at form (naive UTC, seconds); a bare date stays a date and sorts before its times.
+    if value is None:
+        return None
+    v = value.strip()
+    if v == "":
+        return None
+    try:
+        return date.fromisoformat(v).isoformat()
+    except ValueError:
+        pass
+    try:
+        ts = datetime.fromisoformat(v)
+    except ValueError:
+        return None
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts.isoformat(timespec="seconds")
@@ -14,5 +14,5 @@ python scripts\init_db.py
 python scripts\seed_db.py
 
 start "" http://127.0.0.1:8000/
-python app.py
+python scripts\serve.py
 
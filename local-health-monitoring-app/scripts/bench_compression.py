@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BASE_DIR))
+
+from health_app.compaction import sample_payloads
+from health_app.compress import Codec, decode_bytes, register_dictionary, to_json_text, train_dictionary
+from health_app.db import connect, ensure_db
+
+
+def synthetic_payloads(n: int, seed: int = 7) -> list[bytes]:
+    rng = random.Random(seed)
+    out = []
+    for _ in range(n):
+        row = {
+            "age": float(rng.randint(20, 80)),
+            "bmi": rng.uniform(18, 35),
+            "bp_systolic": float(rng.randint(105, 160)),
+            "bp_diastolic": float(rng.randint(65, 100)),
+            "sugar_mg_dl": float(rng.randint(80, 160)),
+            "steps": float(rng.randint(1000, 14000)),
+            "sleep_hours": round(rng.uniform(4, 9), 1),
+            "heart_rate": float(rng.randint(55, 95)),
+            "calories": float(rng.randint(1600, 3200)),
+            "activity_minutes": float(rng.randint(0, 90)),
+            "sleep_quality": float(rng.randint(1, 5)),
+            "mood": float(rng.randint(1, 5)),
+            "stress": float(rng.randint(1, 5)),
+            "pain": float(rng.randint(0, 5)),
+            "avg_sleep_7d": rng.uniform(5, 8),
+            "avg_steps_7d": rng.uniform(3000, 10000),
+            "avg_hr_7d": rng.uniform(60, 85),
+        }
+        out.append(to_json_text(row).encode("utf-8"))
+    return out
+
+
+def bench(codec: Codec, rows: list[bytes], repeat: int) -> dict:
+    blobs = [codec.encode(r) for r in rows]
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        for r in rows:
+            codec.encode(r)
+    enc = (time.perf_counter() - t0) / (repeat * len(rows))
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        for b in blobs:
+            decode_bytes(codec.tag, b)
+    dec = (time.perf_counter() - t0) / (repeat * len(rows))
+    raw_bytes = sum(map(len, rows))
+    stored = sum(map(len, blobs))
+    return {"bytes": stored, "ratio": raw_bytes / stored, "encode_us": enc * 1e6, "decode_us": dec * 1e6}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare per-row blob codecs: size ratio and encode/decode time per row.")
+    parser.add_argument("--db", type=str, default=None, help="Sample payloads from this DB instead of synthetic rows")
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--dict-size", type=int, default=4096)
+    args = parser.parse_args()
+
+    if args.db:
+        ensure_db(Path(args.db))
+        conn = connect(Path(args.db))
+        rows = sample_payloads(conn, args.rows)
+        conn.close()
+    else:
+        rows = synthetic_payloads(args.rows)
+    if not rows:
+        print("No payloads to benchmark.")
+        return
+
+    # Train on one half and measure on the other, so the ratio is not flattered.
+    train, test = rows[: len(rows) // 2] or rows, rows[len(rows) // 2 :] or rows
+    register_dictionary(0, train_dictionary(train, size=args.dict_size))
+
+    codecs = {
+        "legacy json+zlib:6": None,
+        "raw": Codec("raw", level=0),
+        "zlib:6": Codec("zlib", level=6),
+        "zlib:9": Codec("zlib", level=9),
+        "zdict:6": Codec("zdict", level=6, dict_id=0),
+        "zdict:9": Codec("zdict", level=9, dict_id=0),
+    }
+    raw_bytes = sum(map(len, test))
+    print(f"{len(test)} rows, {raw_bytes / len(test):.0f} bytes/row uncompressed")
+    print(f"{'scheme':<20}{'bytes/row':>10}{'ratio':>8}{'enc us':>9}{'dec us':>9}")
+    for name, codec in codecs.items():
+        if codec is None:
+            # Previous layout: plain JSON text plus a zlib copy of the same payload.
+            r = bench(Codec("zlib", level=6), test, args.repeat)
+            r["bytes"] += raw_bytes
+            r["ratio"] = raw_bytes / r["bytes"]
+        else:
+            r = bench(codec, test, args.repeat)
+        print(f"{name:<20}{r['bytes'] / len(test):>10.1f}{r['ratio']:>8.2f}{r['encode_us']:>9.1f}{r['decode_us']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BASE_DIR))
+
+from health_app.features import build_feature_row, build_feature_row_rolling
+from health_app.rolling import DEFAULT_HORIZON, RollingFeatureEngine
+
+
+def synthetic_history(n: int, seed: int = 11) -> list[dict]:
+    rng = random.Random(seed)
+    start = date(2024, 1, 1)
+    out = []
+    for i in range(n):
+        out.append(
+            {
+                "id": str(i),
+                "entry_date": (start + timedelta(days=i)).isoformat(),
+                "created_at": f"{(start + timedelta(days=i)).isoformat()}T08:00:00",
+                "steps": rng.randint(1000, 14000) if rng.random() > 0.2 else None,
+                "sleep_hours": round(rng.uniform(4, 9), 1) if rng.random() > 0.3 else None,
+                "heart_rate": rng.randint(55, 95) if rng.random() > 0.5 else None,
+                "bp_systolic": rng.randint(105, 160),
+                "bp_diastolic": rng.randint(65, 100),
+                "sugar_mg_dl": None,
+            }
+        )
+    return out
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare the pandas feature path with the streaming rolling-window engine.")
+    parser.add_argument("--entries", type=int, default=2000)
+    args = parser.parse_args()
+
+    profile = {"age": 40, "weight_kg": 80.0, "height_cm": 178.0}
+    history = synthetic_history(args.entries)
+
+    t0 = time.perf_counter()
+    reference = []
+    for i, entry in enumerate(history):
+        recent = history[max(0, i + 1 - DEFAULT_HORIZON) : i + 1][::-1]
+        reference.append(build_feature_row(profile, entry, recent))
+    t_pandas = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    engine = RollingFeatureEngine()
+    streamed = []
+    for entry in history:
+        engine.push(entry)
+        streamed.append(build_feature_row_rolling(profile, entry, engine.means()))
+    t_engine = time.perf_counter() - t0
+
+    mismatches = sum(1 for a, b in zip(reference, streamed) if a != b)
+    n = len(history)
+    print(f"{n} entries, {mismatches} mismatching feature rows")
+    print(f"pandas build_feature_row: {t_pandas / n * 1e6:9.1f} us/entry")
+    print(f"rolling engine:           {t_engine / n * 1e6:9.1f} us/entry ({t_pandas / t_engine:.0f}x faster)")
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
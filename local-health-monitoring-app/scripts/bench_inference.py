@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BASE_DIR))
+
+import numpy as np
+import pandas as pd
+
+from health_app.ml import DEFAULT_FEATURES, train_model_from_csv
+from health_app.scoring import load_scorer, scorer_path
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Check the NumPy scorer against sklearn and time single-row inference.")
+    parser.add_argument("--csv", type=str, default=str(BASE_DIR / "data" / "sample_training_data.csv"))
+    parser.add_argument("--rows", type=int, default=2000, help="Random rows scored in addition to the training rows")
+    # The model is fit on float32 data, so sklearn scores in float32; the NumPy scorer accumulates in float64.
+    parser.add_argument("--tolerance", type=float, default=1e-5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        model_path = Path(tmp) / "model_bundle.joblib"
+        bundle = train_model_from_csv(Path(args.csv), model_path, k_best=10)
+        scorer = load_scorer(scorer_path(model_path))
+
+    df = pd.read_csv(args.csv)
+    X_train = df[bundle.features].fillna(0.0).astype(np.float32).to_numpy()
+    rng = np.random.default_rng(0)
+    lo, hi = X_train.min(axis=0), X_train.max(axis=0)
+    span = np.where(hi > lo, hi - lo, 1.0)
+    X_rand = (lo - span + rng.random((args.rows, len(bundle.features))) * 3 * span).astype(np.float32)
+    X = np.vstack([X_train, X_rand])
+
+    expected = bundle.model.predict_proba(bundle.selector.transform(X))[:, 1]
+    got = scorer.score_matrix(X)
+    max_diff = float(np.max(np.abs(expected - got)))
+    print(f"{len(X)} rows, max |sklearn - numpy| = {max_diff:.2e} (tolerance {args.tolerance:.0e})")
+
+    rows = [dict(zip(bundle.features, map(float, x))) for x in X[:500]]
+    t0 = time.perf_counter()
+    for x in X[:500]:
+        bundle.model.predict_proba(bundle.selector.transform(x.reshape(1, -1)))
+    t_sklearn = (time.perf_counter() - t0) / 500
+    t0 = time.perf_counter()
+    for row in rows:
+        scorer.score_row(row)
+    t_numpy = (time.perf_counter() - t0) / 500
+    print(f"sklearn selector+predict_proba: {t_sklearn * 1e6:8.1f} us/row")
+    print(f"numpy scorer (incl. dict->vector): {t_numpy * 1e6:8.1f} us/row ({t_sklearn / t_numpy:.0f}x faster)")
+    unused = [f for f in DEFAULT_FEATURES if f not in bundle.features]
+    if unused:
+        print(f"features missing from CSV (always 0): {unused}")
+
+    if max_diff > args.tolerance:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import argparse
+import gc
+import random
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BASE_DIR))
+
+import numpy as np
+import pandas as pd
+
+from health_app.recommendations import build_recommendations, build_recommendations_batch, group_recommendations
+
+
+def synthetic_cohort(n: int, seed: int = 5) -> tuple[list[dict], list[dict | None], list[float | None]]:
+    # Values cluster on the classification thresholds, and about one in seven is missing.
+    rng = random.Random(seed)
+
+    def maybe(value):
+        return None if rng.random() < 0.15 else value
+
+    profiles, latest, scores = [], [], []
+    for _ in range(n):
+        profiles.append(
+            {
+                "weight_kg": maybe(rng.uniform(40, 140)),
+                "height_cm": maybe(rng.choice([rng.uniform(145, 200), 0])),
+                "bp_systolic": maybe(rng.randint(95, 175)),
+                "bp_diastolic": maybe(rng.randint(55, 110)),
+                "sugar_mg_dl": maybe(rng.choice([rng.uniform(70, 200), 100, 126])),
+            }
+        )
+        latest.append(
+            None
+            if rng.random() < 0.3
+            else {
+                "steps": maybe(rng.choice([rng.randint(0, 15000), 4999, 5000])),
+                "bp_systolic": maybe(rng.choice([119, 120, 129, 130, 139, 140, rng.randint(95, 175)])),
+                "bp_diastolic": maybe(rng.choice([79, 80, 89, 90, rng.randint(55, 110)])),
+                "sugar_mg_dl": maybe(rng.uniform(70, 200)),
+            }
+        )
+        scores.append(maybe(rng.choice([rng.random(), 0.5, 0.745, 0.75, 0.755, 0.995, 1.0])))
+    return profiles, latest, scores
+
+
+def best_of(repeat: int, fn) -> tuple[float, object]:
+    # Like timeit: the collector is paused so neither side pays for the other's garbage.
+    best, result = float("inf"), None
+    gc.collect()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            result = fn()
+            best = min(best, time.perf_counter() - t0)
+    finally:
+        gc.enable()
+    return best, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare build_recommendations row by row with the batch engine.")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=5)
+    parser.add_argument("--min-speedup", type=float, default=50.0, help="Exit 1 if the batch engine is slower than this")
+    args = parser.parse_args()
+
+    profiles, latest, scores = synthetic_cohort(args.rows, args.seed)
+    profile_frame = pd.DataFrame(profiles)
+    latest_frame = pd.DataFrame([e or {} for e in latest])
+    has_entry = np.array([e is not None for e in latest])
+    score_array = np.array([np.nan if s is None else s for s in scores])
+
+    t_scalar, reference = best_of(
+        max(1, args.repeat // 2), lambda: [build_recommendations(p, e, s) for p, e, s in zip(profiles, latest, scores)]
+    )
+    # The batch side runs in milliseconds, so it gets more samples for a comparable share of wall time.
+    t_batch, batch = best_of(
+        args.repeat * 10, lambda: build_recommendations_batch(profile_frame, latest_frame, score_array, has_entry=has_entry)
+    )
+
+    mismatches = sum(1 for a, b in zip(reference, group_recommendations(batch, args.rows)) if a != b)
+    speedup = t_scalar / t_batch
+    print(f"{args.rows} rows, {len(batch)} recommendations, {mismatches} mismatching rows")
+    print(f"build_recommendations loop:  {t_scalar * 1000:9.1f} ms")
+    print(f"build_recommendations_batch: {t_batch * 1000:9.1f} ms ({speedup:.0f}x faster)")
+    if mismatches or speedup < args.min_speedup:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import sys
+import time
+from bisect import bisect_right
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BASE_DIR))
+
+from bench_recommendations import best_of, synthetic_cohort
+
+from health_app.rules import DEFAULT_RULES_PATH, DERIVED_METRICS, compile_rules
+
+# (source, metric, low, high): where synthetic rules put their bands.
+METRICS = [
+    ("profile", "bmi", 15.0, 45.0),
+    ("profile", "weight_kg", 40.0, 140.0),
+    ("latest_or_profile", "bp_systolic", 95.0, 175.0),
+    ("latest_or_profile", "sugar_mg_dl", 70.0, 200.0),
+    ("latest", "steps", 0.0, 15000.0),
+    ("model", "model_score", 0.0, 1.0),
+]
+
+
+def synthetic_spec(extra: int, seed: int = 5) -> dict:
+    # The shipped rules plus `extra` rules that each flag one narrow band, so few of them fire for any profile.
+    rng = random.Random(seed)
+    spec = json.loads(DEFAULT_RULES_PATH.read_text(encoding="utf-8"))
+    for i in range(extra):
+        source, metric, low, high = rng.choice(METRICS)
+        start = rng.uniform(low, high)
+        width = (high - low) / 500
+        spec["rules"].append(
+            {
+                "id": f"synthetic_{i}",
+                "source": source,
+                "metric": metric,
+                "edges": [start, start + width],
+                "bands": ["below", "flagged", "above"],
+                "records": {
+                    "flagged": {
+                        "title": f"Check {metric.replace('_', ' ')}",
+                        "priority": "low",
+                        "text": f"Synthetic rule {i}.",
+                        "rationale": f"{metric} is {{value:.1f}}.",
+                    }
+                },
+            }
+        )
+    return spec
+
+
+def _read(source: str, metric: str, profile: dict, latest: dict | None, score: float | None):
+    if source == "model":
+        return score
+    if source == "profile":
+        return DERIVED_METRICS[metric](profile) if metric in DERIVED_METRICS else profile.get(metric)
+    if source == "latest":
+        return latest.get(metric) if latest else None
+    return (latest if latest else profile).get(metric)
+
+
+def _flatten(bands) -> list[str]:
+    return [bands] if isinstance(bands, str) else [name for item in bands for name in _flatten(item)]
+
+
+def naive_rules(spec: dict) -> list[tuple]:
+    # The rule table as written: one entry per rule, walked in full for every profile.
+    rules = []
+    for rule in spec["rules"]:
+        metrics = [rule["metric"]] if isinstance(rule["metric"], str) else rule["metric"]
+        edges = [rule["edges"]] if isinstance(rule["metric"], str) else rule["edges"]
+        strides = [1] * len(metrics)
+        for d in range(len(metrics) - 2, -1, -1):
+            strides[d] = strides[d + 1] * (len(edges[d + 1]) + 1)
+        records = [rule.get("records", {}).get(band) for band in _flatten(rule["bands"])]
+        rules.append((rule.get("source", "latest_or_profile"), metrics, edges, strides, records))
+    return rules
+
+
+def naive_evaluate(rules: list[tuple], fallback: dict | None, profile: dict, latest: dict | None, score: float | None) -> list[dict]:
+    out = []
+    for source, metrics, edges, strides, records in rules:
+        cell = 0
+        for metric, metric_edges, stride in zip(metrics, edges, strides):
+            value = _read(source, metric, profile, latest, score)
+            if value is None:
+                break
+            value = float(value)
+            if value != value:
+                break
+            cell += bisect_right(metric_edges, value) * stride
+        else:
+            record = records[cell]
+            if record is not None:
+                out.append({k: v.format(value=value) for k, v in record.items()})
+    if not out and fallback is not None:
+        out.append(dict(fallback))
+    return out
+
+
+def _canonical(recos: list[dict]) -> list[tuple]:
+    # The compiled rulebook groups rules by metric, so compare the recommendations without their order.
+    return sorted(tuple(sorted(r.items())) for r in recos)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Time compiled rule evaluation as the rulebook grows.")
+    parser.add_argument("--sizes", default="0,50,200,500", help="Synthetic rules added to the shipped ones, per run")
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=5)
+    parser.add_argument("--max-ratio", type=float, default=2.0, help="Exit 1 if the largest rulebook is this much slower than the smallest")
+    args = parser.parse_args()
+
+    profiles, latest, scores = synthetic_cohort(args.rows, args.seed)
+    cases = list(zip(profiles, latest, scores))
+    per_row = []
+    mismatches = 0
+    print(f"{'rules':>6} {'compile ms':>11} {'compiled us/row':>16} {'per-rule us/row':>16}")
+    for extra in (int(s) for s in args.sizes.split(",")):
+        spec = synthetic_spec(extra, args.seed)
+        t0 = time.perf_counter()
+        rulebook = compile_rules(spec)
+        t_compile = time.perf_counter() - t0
+        rules = naive_rules(spec)
+        fallback = spec.get("fallback")
+
+        t_compiled, compiled = best_of(args.repeat, lambda: [rulebook.evaluate(p, e, s) for p, e, s in cases])
+        t_naive, naive = best_of(args.repeat, lambda: [naive_evaluate(rules, fallback, p, e, s) for p, e, s in cases])
+        mismatches += sum(1 for a, b in zip(compiled, naive) if _canonical(a) != _canonical(b))
+        per_row.append(t_compiled / args.rows)
+        print(
+            f"{rulebook.rule_count:>6} {t_compile * 1000:>11.1f} {t_compiled / args.rows * 1e6:>16.2f} "
+            f"{t_naive / args.rows * 1e6:>16.2f}"
+        )
+
+    ratio = per_row[-1] / per_row[0]
+    print(f"{mismatches} mismatching rows; largest/smallest compiled cost: {ratio:.2f}x")
+    if mismatches or ratio > args.max_ratio:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Callable, Iterator
+from unittest import mock
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BASE_DIR))
+
+from app import create_app
+from health_app.db import ensure_db, get_pool
+from health_app.features import build_feature_row
+from health_app.ingest import bulk_import
+from health_app.ml import ensure_scorer, predict_risk, train_model_from_csv
+from health_app.recommendations import build_recommendations
+from health_app.repo import (
+    DEFAULT_USER,
+    export_all_data,
+    get_latest_entry,
+    get_profile,
+    list_recent_entries,
+    save_daily_entry,
+    save_profile,
+)
+from health_app.rolling import RollingFeatureEngine
+
+START = date(2000, 1, 1)
+
+
+def synthetic_profile(rng: random.Random) -> dict:
+    return {
+        "age": rng.randint(20, 80),
+        "weight_kg": round(rng.uniform(50, 110), 1),
+        "height_cm": round(rng.uniform(150, 195), 1),
+        "bp_systolic": rng.randint(105, 150),
+        "bp_diastolic": rng.randint(65, 95),
+        "sugar_mg_dl": round(rng.uniform(80, 140), 1),
+        "past_diseases": "",
+        "medications": "",
+        "notes": "",
+    }
+
+
+def synthetic_entry(rng: random.Random, day: date) -> dict:
+    return {
+        "entry_date": day.isoformat(),
+        "steps": rng.randint(1000, 14000) if rng.random() > 0.2 else None,
+        "sleep_hours": round(rng.uniform(4, 9), 1) if rng.random() > 0.3 else None,
+        "heart_rate": rng.randint(55, 95) if rng.random() > 0.5 else None,
+        "calories": rng.randint(1600, 3200),
+        "activity_minutes": rng.randint(0, 90),
+        "sleep_quality": rng.randint(1, 5),
+        "mood": rng.randint(1, 5),
+        "stress": rng.randint(1, 5),
+        "pain": rng.randint(0, 5),
+        "bp_systolic": rng.randint(105, 160),
+        "bp_diastolic": rng.randint(65, 100),
+        "sugar_mg_dl": round(rng.uniform(80, 160), 1) if rng.random() > 0.6 else None,
+        "notes": rng.choice(["", "", "busy day", "felt tired", "long walk"]),
+    }
+
+
+def synthetic_entries(rng: random.Random, n: int) -> Iterator[dict]:
+    for i in range(n):
+        yield synthetic_entry(rng, START + timedelta(days=i))
+
+
+def populate(instance_dir: Path, rows: int, days_per_user: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    db_path = instance_dir / "health.db"
+    ensure_db(db_path)
+    conn = get_pool(db_path).connection()
+    users = [DEFAULT_USER] + [f"user{i:05d}" for i in range(1, -(-rows // days_per_user))]
+    t0 = time.perf_counter()
+    for i, user in enumerate(users):
+        save_profile(conn, synthetic_profile(rng), user)
+        bulk_import(conn, synthetic_entries(rng, min(days_per_user, rows - i * days_per_user)), user_id=user)
+    seconds = time.perf_counter() - t0
+
+    train_model_from_csv(BASE_DIR / "data" / "sample_training_data.csv", instance_dir / "model_bundle.joblib")
+    return {"users": len(users), "rows": rows, "populate_s": round(seconds, 3)}
+
+
+def timed(fn: Callable[[], object], repeat: int) -> dict:
+    fn()
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    samples.sort()
+    return {
+        "n": repeat,
+        "min_ms": round(samples[0], 4),
+        "median_ms": round(statistics.median(samples), 4),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 4),
+        "mean_ms": round(statistics.fmean(samples), 4),
+    }
+
+
+def run_scale(rows: int, args: argparse.Namespace) -> dict:
+    with tempfile.TemporaryDirectory(prefix="health-bench-") as tmp:
+        instance_dir = Path(tmp)
+        setup = populate(instance_dir, rows, args.days_per_user, args.seed)
+        pool = get_pool(instance_dir / "health.db")
+        conn = pool.connection()
+        scorer = ensure_scorer(instance_dir / "model_bundle.joblib")
+        rng = random.Random(args.seed + 1)
+        next_day = iter(START + timedelta(days=min(rows, args.days_per_user) + i) for i in range(10**6))
+
+        profile = get_profile(conn)
+        latest = get_latest_entry(conn)
+        recent = list_recent_entries(conn, limit=30)
+        rolling = RollingFeatureEngine.from_entries(reversed(recent)).means()
+        score = predict_risk(scorer, profile, latest, recent, rolling_means=rolling)
+
+        client = create_app(instance_dir).test_client()
+        # Without a dashboard cache every GET / reads, scores and renders, as the first view after a write does.
+        with mock.patch.dict(os.environ, {"HEALTH_DASHBOARD_CACHE": "0"}):
+            uncached = create_app(instance_dir).test_client()
+
+        def post_checkin() -> None:
+            form = {k: "" if v is None else str(v) for k, v in synthetic_entry(rng, next(next_day)).items()}
+            client.post("/checkin", data=form)
+
+        slow = max(1, args.repeat // 20)
+        ops: dict[str, tuple[Callable[[], object], int]] = {
+            "save_daily_entry": (lambda: save_daily_entry(conn, synthetic_entry(rng, next(next_day))), args.repeat),
+            "list_recent_entries": (lambda: list_recent_entries(conn, limit=30), args.repeat),
+            "build_feature_row": (lambda: build_feature_row(profile, latest, recent), args.repeat),
+            "predict_risk": (lambda: predict_risk(scorer, profile, latest, recent, rolling_means=rolling), args.repeat),
+            "build_recommendations": (lambda: build_recommendations(profile, latest, score), args.repeat),
+            "export_all_data": (lambda: export_all_data(conn), slow),
+            "GET /": (lambda: uncached.get("/"), args.repeat),
+            "GET / (cached)": (lambda: client.get("/"), args.repeat),
+            "POST /checkin": (post_checkin, args.repeat),
+        }
+        results = {}
+        for name, (fn, repeat) in ops.items():
+            results[name] = timed(fn, repeat)
+            r = results[name]
+            print(f"  {name:<22} median {r['median_ms']:10.3f} ms   p95 {r['p95_ms']:10.3f} ms   (n={r['n']})")
+        pool.close_all()
+        return {"rows": rows, "setup": setup, "ops": results}
+
+
+def git_revision() -> str | None:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Time the app's hot paths against synthetic databases of several sizes.")
+    parser.add_argument("--scales", type=str, default="1000,100000", help="Comma-separated row counts (e.g. 1000,100000,1000000)")
+    parser.add_argument("--days-per-user", type=int, default=3650, help="Entries per synthetic user; rows beyond this go to more users")
+    parser.add_argument("--repeat", type=int, default=200, help="Timed calls per operation (export uses 1/20 of this)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--out", type=str, default=None, help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    report = {
+        "meta": {
+            "revision": git_revision(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": vars(args),
+        },
+        "scales": [],
+    }
+    for rows in (int(s) for s in args.scales.split(",") if s.strip()):
+        print(f"{rows} rows")
+        report["scales"].append(run_scale(rows, args))
+
+    if args.out:
+        Path(args.out).write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print(f"Wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BASE_DIR))
+
+from health_app.compaction import compact
+from health_app.compress import codec_from_spec
+from health_app.db import connect, ensure_db
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Re-encode stored blobs with one codec and VACUUM the DB.")
+    parser.add_argument("--db", type=str, default=str(BASE_DIR / "instance" / "health.db"), help="Path to the SQLite DB")
+    parser.add_argument("--codec", type=str, default=os.environ.get("HEALTH_CODEC", "zlib:6"), help="raw, zlib[:level] or zdict:<id>[:level]")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--all", action="store_true", help="Rewrite rows even if they already use this codec (e.g. to change level)")
+    args = parser.parse_args()
+
+    db_path = Path(args.db)
+    ensure_db(db_path)
+    codec = codec_from_spec(args.codec)
+    size_before = db_path.stat().st_size
+
+    conn = connect(db_path)
+    try:
+        report = compact(conn, codec, batch_size=args.batch_size, force=args.all)
+    finally:
+        conn.close()
+
+    for table, (rows, before, after) in report.items():
+        print(f"{table}: rewrote {rows} rows, {before} -> {after} blob bytes")
+    print(f"DB file: {size_before} -> {db_path.stat().st_size} bytes (codec {codec.tag}, level {codec.level})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BASE_DIR))
+
+from health_app.db import ensure_db, get_pool
+from health_app.ingest import bulk_import, read_rows
+from health_app.repo import DEFAULT_USER
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Bulk-import daily entries from a CSV or NDJSON file.")
+    parser.add_argument("path", type=str, help="CSV (header row) or NDJSON (one entry per line) file")
+    parser.add_argument("--db", type=str, default=str(BASE_DIR / "instance" / "health.db"), help="Path to the SQLite DB")
+    parser.add_argument("--user", type=str, default=DEFAULT_USER, help="User the entries belong to")
+    parser.add_argument("--format", choices=["csv", "ndjson"], default=None, help="Input format (default: from file extension)")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Rows per executemany call")
+    args = parser.parse_args()
+
+    db_path = Path(args.db)
+    ensure_db(db_path)
+    conn = get_pool(db_path).connection()
+    result = bulk_import(conn, read_rows(Path(args.path), args.format), user_id=args.user, batch_size=args.batch_size)
+
+    for err in result.errors:
+        print(f"skipped {err}")
+    print(
+        f"Imported {result.rows} rows ({result.skipped} skipped, {result.features} feature rows) "
+        f"in {result.seconds:.2f}s = {result.rows_per_sec:,.0f} rows/s"
+    )
+
+
+if __name__ == "__main__":
+    main()
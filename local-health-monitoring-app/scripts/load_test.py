@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import argparse
+import http.client
+import json
+import statistics
+import threading
+import time
+from datetime import date, timedelta
+from urllib.parse import urlencode, urlsplit
+
+
+def worker(host: str, port: int, method: str, path: str, deadline: float, results: list[float], errors: list[int], seq) -> None:
+    conn = http.client.HTTPConnection(host, port, timeout=30)
+    while time.perf_counter() < deadline:
+        body, headers = None, {}
+        if method == "POST":
+            day = date(2100, 1, 1) + timedelta(days=seq())
+            body = urlencode({"entry_date": day.isoformat(), "steps": "6000", "sleep_hours": "7.0", "heart_rate": "70"})
+            headers = {"Content-Type": "application/x-www-form-urlencoded"}
+        t0 = time.perf_counter()
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            resp = conn.getresponse()
+            resp.read()
+        except (OSError, http.client.HTTPException):
+            errors.append(1)
+            conn.close()
+            conn = http.client.HTTPConnection(host, port, timeout=30)
+            continue
+        if resp.status >= 400:
+            errors.append(resp.status)
+        results.append(time.perf_counter() - t0)
+    conn.close()
+
+
+def run(url: str, method: str, path: str, concurrency: int, seconds: float) -> dict:
+    parts = urlsplit(url)
+    results: list[float] = []
+    errors: list[int] = []
+    counter = iter(range(10**9))
+    lock = threading.Lock()
+
+    def seq() -> int:
+        with lock:
+            return next(counter)
+
+    deadline = time.perf_counter() + seconds
+    threads = [
+        threading.Thread(
+            target=worker,
+            args=(parts.hostname, parts.port or 80, method, path, deadline, results, errors, seq),
+        )
+        for _ in range(concurrency)
+    ]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+    results.sort()
+    return {
+        "route": f"{method} {path}",
+        "requests": len(results),
+        "errors": len(errors),
+        "rps": round(len(results) / elapsed, 1),
+        "p50_ms": round(statistics.median(results) * 1000, 2) if results else None,
+        "p95_ms": round(results[int(len(results) * 0.95)] * 1000, 2) if results else None,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure requests/second against a running server (see scripts/serve.py).")
+    parser.add_argument("--url", type=str, default="http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", type=int, default=16, help="Client threads, each with its own keep-alive connection")
+    parser.add_argument("--seconds", type=float, default=10.0, help="Duration per route")
+    parser.add_argument("--out", type=str, default=None, help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    report = []
+    for method, path in (("GET", "/"), ("POST", "/checkin")):
+        r = run(args.url, method, path, args.concurrency, args.seconds)
+        report.append(r)
+        print(f"{r['route']:<14} {r['rps']:8.1f} req/s   p50 {r['p50_ms']} ms   p95 {r['p95_ms']} ms   errors {r['errors']}")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
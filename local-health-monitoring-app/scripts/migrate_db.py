@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BASE_DIR))
+
+from health_app.db import connect, ensure_db
+from health_app.migrations import SCHEMA_VERSION, migrate, schema_version
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Upgrade a health.db file to the current schema version.")
+    parser.add_argument("--db", type=str, default=str(BASE_DIR / "instance" / "health.db"), help="Path to the SQLite DB")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Rows converted per executemany batch")
+    args = parser.parse_args()
+
+    db_path = Path(args.db)
+    if not db_path.exists():
+        ensure_db(db_path)
+        print(f"Created new DB at schema v{SCHEMA_VERSION}: {db_path}")
+        return
+
+    conn = connect(db_path)
+    try:
+        before = schema_version(conn)
+        t0 = time.perf_counter()
+        applied = migrate(conn, batch_size=args.batch_size)
+        elapsed = time.perf_counter() - t0
+    finally:
+        conn.close()
+    ensure_db(db_path)
+
+    if not applied:
+        print(f"{db_path} is already at schema v{before}.")
+        return
+    for version, rows in applied:
+        print(f"Applied migration v{version}: {rows} rows")
+    print(f"Migrated {db_path} from v{before} to v{SCHEMA_VERSION} in {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BASE_DIR))
+
+from health_app.db import connect, ensure_db
+from health_app.rollups import rebuild_rollups
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Recompute weekly/monthly rollups from daily_entry.")
+    parser.add_argument("--db", type=str, default=str(BASE_DIR / "instance" / "health.db"), help="Path to the SQLite DB")
+    parser.add_argument("--user", type=str, default=None, help="Only rebuild this user's rollups (default: all users)")
+    args = parser.parse_args()
+
+    db_path = Path(args.db)
+    ensure_db(db_path)
+    conn = connect(db_path)
+    try:
+        t0 = time.perf_counter()
+        rows = rebuild_rollups(conn, args.user)
+        elapsed = time.perf_counter() - t0
+    finally:
+        conn.close()
+    print(f"Rebuilt {rows} rollup rows in {elapsed:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BASE_DIR))
+
+from health_app.db import connect, ensure_db
+from health_app.history import score_history
+from health_app.ml import ensure_scorer
+from health_app.repo import DEFAULT_USER, get_profile
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Score every stored check-in with the trained model in one batch.")
+    parser.add_argument("--db", type=str, default=str(BASE_DIR / "instance" / "health.db"), help="Path to the SQLite DB")
+    parser.add_argument("--model", type=str, default=str(BASE_DIR / "instance" / "model_bundle.joblib"), help="Path to the model bundle")
+    parser.add_argument("--user", type=str, default=DEFAULT_USER, help="User whose check-ins are scored")
+    parser.add_argument("--out", type=str, default=None, help="Write scores to this .json or .csv file (default: print summary only)")
+    args = parser.parse_args()
+
+    db_path = Path(args.db)
+    ensure_db(db_path)
+    scorer = ensure_scorer(Path(args.model))
+    if scorer is None:
+        raise SystemExit("No trained model found; run scripts/train_model.py first.")
+
+    conn = connect(db_path)
+    try:
+        t0 = time.perf_counter()
+        scores = score_history(conn, scorer, get_profile(conn, args.user), args.user)
+        elapsed = time.perf_counter() - t0
+    finally:
+        conn.close()
+
+    print(f"Scored {len(scores)} entries in {elapsed * 1000:.1f} ms")
+    if args.out:
+        out = Path(args.out)
+        if out.suffix.lower() == ".csv":
+            with out.open("w", encoding="utf-8", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=["entry_id", "entry_date", "risk"])
+                writer.writeheader()
+                writer.writerows(scores)
+        else:
+            out.write_text(json.dumps(scores, indent=2), encoding="utf-8")
+        print(f"Wrote {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BASE_DIR))
+
+from app import create_app
+
+
+def serve_gunicorn(app, args: argparse.Namespace) -> None:
+    from gunicorn.app.base import BaseApplication
+
+    class HealthApplication(BaseApplication):
+        def load_config(self) -> None:
+            options = {
+                "bind": f"{args.host}:{args.port}",
+                "workers": args.workers,
+                "threads": args.threads,
+                "worker_class": "gthread" if args.threads > 1 else "sync",
+                "keepalive": args.keepalive,
+                "timeout": args.timeout,
+                "graceful_timeout": args.graceful_timeout,
+                "max_requests": args.max_requests,
+                "max_requests_jitter": args.max_requests // 10,
+                "preload_app": True,
+                "accesslog": "-" if args.access_log else None,
+            }
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return app
+
+    HealthApplication().run()
+
+
+def serve_waitress(app, args: argparse.Namespace) -> None:
+    from waitress import serve
+
+    # Waitress has no worker processes; give it the same total concurrency as threads.
+    serve(app, host=args.host, port=args.port, threads=args.workers * args.threads, channel_timeout=args.keepalive)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run the app with a production server (gunicorn on POSIX, waitress on Windows).")
+    parser.add_argument("--host", type=str, default=os.environ.get("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", "8000")))
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=int(os.environ.get("WEB_CONCURRENCY", os.cpu_count() or 1)),
+        help="Worker processes (default: WEB_CONCURRENCY or the CPU count)",
+    )
+    parser.add_argument("--threads", type=int, default=int(os.environ.get("WEB_THREADS", "4")), help="Threads per worker")
+    parser.add_argument("--keepalive", type=int, default=5, help="Seconds to hold idle keep-alive connections")
+    parser.add_argument("--timeout", type=int, default=30, help="Seconds before a stuck worker is restarted")
+    parser.add_argument("--graceful-timeout", type=int, default=30, help="Seconds workers get to finish requests on reload/stop")
+    parser.add_argument("--max-requests", type=int, default=0, help="Recycle a worker after this many requests (0 = never)")
+    parser.add_argument("--access-log", action="store_true", help="Log every request to stdout")
+    parser.add_argument("--server", choices=["auto", "gunicorn", "waitress"], default="auto")
+    args = parser.parse_args()
+
+    # Built once before workers fork: config, schema checks and the model are loaded a single time.
+    app = create_app()
+    server = args.server
+    if server == "auto":
+        server = "waitress" if os.name == "nt" else "gunicorn"
+    if server == "gunicorn":
+        serve_gunicorn(app, args)
+    else:
+        serve_waitress(app, args)
+
+
+if __name__ == "__main__":
+    main()
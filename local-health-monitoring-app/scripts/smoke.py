@@ -1,26 +1,90 @@
 from __future__ import annotations
 
+import argparse
+import os
+import statistics
+import subprocess
 import sys
+import time
+from importlib import metadata
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parents[1]
 sys.path.insert(0, str(BASE_DIR))
 
+# Modules the form pages must not load; they are only needed for training and the pandas reference path.
+HEAVY_MODULES = ("pandas", "sklearn", "scipy", "joblib")
+
+FIRST_REQUEST = f"""
+import sys
+from app import create_app
+client = create_app().test_client()
+for path in ("/checkin", "/profile"):
+    assert client.get(path).status_code == 200, path
+print(",".join(m for m in {HEAVY_MODULES!r} if m in sys.modules))
+"""
+
+
+def import_report(top: int) -> list[tuple[str, int]]:
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"], cwd=BASE_DIR, capture_output=True, text=True, check=True
+    )
+    totals: dict[str, int] = {}
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, _, cumulative, name = (part.strip() for part in line.replace("import time:", "|", 1).split("|"))
+        # A package's largest cumulative time is its outermost import, which includes its submodules.
+        package = name.split(".")[0]
+        totals[package] = max(totals.get(package, 0), int(cumulative))
+    totals.pop("app", None)
+    return sorted(totals.items(), key=lambda kv: kv[1], reverse=True)[:top]
+
+
+def first_request_ms() -> tuple[float, str]:
+    t0 = time.perf_counter()
+    out = subprocess.run([sys.executable, "-c", FIRST_REQUEST], cwd=BASE_DIR, capture_output=True, text=True, check=True)
+    return (time.perf_counter() - t0) * 1000, out.stdout.strip()
+
 
 def main() -> None:
-    import flask
-    import pandas
-    import sklearn
+    parser = argparse.ArgumentParser(description="Import/route smoke test plus a cold-start budget check.")
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        default=float(os.environ.get("HEALTH_STARTUP_BUDGET_MS", "1500")),
+        help="Max median time from process start to the first served request (default 1500, env HEALTH_STARTUP_BUDGET_MS)",
+    )
+    parser.add_argument("--runs", type=int, default=3, help="Cold starts to time")
+    parser.add_argument("--top", type=int, default=8, help="Slowest top-level imports to list")
+    args = parser.parse_args()
 
     from app import create_app
 
     app = create_app()
     print("imports_ok")
-    print("flask", flask.__version__)
-    print("pandas", pandas.__version__)
-    print("sklearn", sklearn.__version__)
+    for dist in ("flask", "numpy", "pandas", "scikit-learn"):
+        print(dist, metadata.version(dist))
     print("routes", len(list(app.url_map.iter_rules())))
 
+    print("import time (cumulative, python -X importtime):")
+    for package, us in import_report(args.top):
+        print(f"  {package:<20} {us / 1000:8.1f} ms")
+
+    runs = [first_request_ms() for _ in range(args.runs)]
+    median = statistics.median(ms for ms, _ in runs)
+    heavy = runs[-1][1]
+    print(f"cold start to first request: {median:.0f} ms median of {args.runs} (budget {args.budget_ms:.0f} ms)")
+    failed = False
+    if heavy:
+        print(f"FAIL: form pages loaded {heavy}")
+        failed = True
+    if median > args.budget_ms:
+        print("FAIL: cold start over budget")
+        failed = True
+    if failed:
+        raise SystemExit(1)
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BASE_DIR))
+
+from health_app.compaction import compact, train_and_store_dictionary
+from health_app.compress import Codec
+from health_app.db import connect, ensure_db
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Train a zlib preset dictionary from stored rows and save it as a new version.")
+    parser.add_argument("--db", type=str, default=str(BASE_DIR / "instance" / "health.db"), help="Path to the SQLite DB")
+    parser.add_argument("--samples", type=int, default=2000, help="Most recent rows sampled per table")
+    parser.add_argument("--size", type=int, default=4096, help="Dictionary size in bytes (zlib uses at most 32 KiB)")
+    parser.add_argument("--level", type=int, default=6, help="Compression level used by --compact")
+    parser.add_argument("--compact", action="store_true", help="Re-encode all rows with the new dictionary and VACUUM")
+    args = parser.parse_args()
+
+    db_path = Path(args.db)
+    ensure_db(db_path)
+    conn = connect(db_path)
+    try:
+        dict_id = train_and_store_dictionary(conn, sample_limit=args.samples, size=args.size)
+        if dict_id is None:
+            print("No stored rows to sample yet; nothing trained.")
+            return
+        print(f"Saved dictionary {dict_id}. Use HEALTH_CODEC=zdict:{dict_id} (or zdict:latest) for new writes.")
+        if args.compact:
+            report = compact(conn, Codec("zdict", level=args.level, dict_id=dict_id))
+            for table, (rows, before, after) in report.items():
+                print(f"{table}: rewrote {rows} rows, {before} -> {after} blob bytes")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
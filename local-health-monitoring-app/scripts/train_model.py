@@ -1,20 +1,133 @@
 from __future__ import annotations
 
-from pathlib import Path
+import argparse
 import sys
+import time
+from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parents[1]
 sys.path.insert(0, str(BASE_DIR))
 
-from health_app.ml import train_model_from_csv
+from health_app.ml import (
+    concat_chunks,
+    csv_chunks,
+    feature_chunks,
+    train_model_from_csv,
+    train_model_from_frame,
+    train_model_streaming,
+)
+from health_app.selection import select_model
+from health_app.utils import parse_timestamp
+
+
+def _print_metrics(label: str, metrics: dict[str, float] | None, elapsed: float) -> None:
+    m = metrics or {}
+    print(
+        f"{label:<10} rows={m.get('rows', 0):.0f} accuracy={m.get('accuracy', 0):.4f} "
+        f"log_loss={m.get('log_loss', 0):.4f} brier={m.get('brier', 0):.4f} time={elapsed:.2f}s"
+    )
+
+
+def _params_label(params: dict) -> str:
+    if params["model"] == "tree":
+        return f"tree   k={params['k']:<2} depth={params['max_depth']}"
+    return f"logreg k={params['k']:<2} C={params['C']:g}"
 
 
 def main() -> None:
-    csv_path = BASE_DIR / "data" / "sample_training_data.csv"
-    model_path = BASE_DIR / "instance" / "model_bundle.joblib"
-    bundle = train_model_from_csv(csv_path, model_path, k_best=10)
+    parser = argparse.ArgumentParser(description="Train the local risk model.")
+    parser.add_argument("--csv", type=str, default=str(BASE_DIR / "data" / "sample_training_data.csv"))
+    parser.add_argument("--model", type=str, default=str(BASE_DIR / "instance" / "model_bundle.joblib"))
+    parser.add_argument("--k-best", type=int, default=10)
+    parser.add_argument("--streaming", action="store_true", help="Read the CSV in chunks and train out of core (bounded memory)")
+    parser.add_argument("--chunksize", type=int, default=50_000)
+    parser.add_argument(
+        "--epochs", type=int, default=100, help="Most passes over the data in streaming mode, each one a full read; training stops once the loss levels off"
+    )
+    parser.add_argument("--compare", action="store_true", help="Also train the other mode into a temp file and print both metrics")
+    parser.add_argument(
+        "--max-gap", type=float, default=0.05, help="With --compare: exit 1 if the two log losses differ by more than this"
+    )
+    parser.add_argument(
+        "--from-db",
+        action="store_true",
+        help="Train on feature rows stored with each check-in and their entry_outcome labels instead of --csv",
+    )
+    parser.add_argument("--db", type=str, default=str(BASE_DIR / "instance" / "health.db"))
+    parser.add_argument("--since", type=str, default=None, help="With --from-db: only check-ins created at or after this date/time")
+    parser.add_argument("--until", type=str, default=None, help="With --from-db: only check-ins created before this date/time")
+    parser.add_argument("--user", type=str, default=None, help="With --from-db: only this user's check-ins")
+    parser.add_argument(
+        "--search",
+        action="store_true",
+        help="Cross-validate a grid over k, C / tree depth and model family, then save the best model",
+    )
+    parser.add_argument("--folds", type=int, default=5, help="Cross-validation folds for --search")
+    parser.add_argument("--jobs", type=int, default=-1, help="Parallel fold fits for --search (-1 = all cores)")
+    parser.add_argument("--top", type=int, default=10, help="Candidates to list after --search")
+    args = parser.parse_args()
+
+    csv_path = Path(args.csv)
+    model_path = Path(args.model)
+    if args.from_db:
+        for key in ("since", "until"):
+            raw = getattr(args, key)
+            if raw is not None and parse_timestamp(raw) is None:
+                parser.error(f"--{key} must be an ISO date or datetime")
+        chunks = feature_chunks(
+            Path(args.db), parse_timestamp(args.since), parse_timestamp(args.until), args.user, args.chunksize
+        )
+    else:
+        chunks = csv_chunks(csv_path, args.chunksize)
+
+    if args.search:
+        import pandas as pd
+
+        df = concat_chunks(chunks) if args.from_db else pd.read_csv(csv_path)
+        t0 = time.perf_counter()
+        bundle, results = select_model(df, model_path, folds=args.folds, n_jobs=args.jobs)
+        elapsed = time.perf_counter() - t0
+        print(f"{len(results)} candidates, {bundle.metrics['cv_folds']:.0f}-fold CV, {elapsed:.2f}s wall")
+        for rank, r in enumerate(results[: args.top], start=1):
+            m = r.metrics
+            print(
+                f"{rank:>3}. {_params_label(r.params):<24} log_loss={m['log_loss']:.4f} accuracy={m['accuracy']:.4f} "
+                f"brier={m['brier']:.4f} fit={r.fit_seconds * 1000:.1f}ms"
+            )
+        print(f"Best: {_params_label(bundle.params)}. Selected features: {bundle.selected_features}")
+        print(f"Saved model bundle to: {model_path}")
+        return
+
+    def in_memory(path: Path):
+        if args.from_db:
+            return train_model_from_frame(concat_chunks(chunks), path, k_best=args.k_best)
+        return train_model_from_csv(csv_path, path, k_best=args.k_best)
+
+    def streaming(path: Path):
+        return train_model_streaming(chunks, path, k_best=args.k_best, epochs=args.epochs)
+
+    primary, other = (streaming, in_memory) if args.streaming else (in_memory, streaming)
+    t0 = time.perf_counter()
+    bundle = primary(model_path)
+    elapsed = time.perf_counter() - t0
     print(f"Trained model. Selected features: {bundle.selected_features}")
     print(f"Saved model bundle to: {model_path}")
+    _print_metrics("streaming" if args.streaming else "in-memory", bundle.metrics, elapsed)
+
+    if args.compare:
+        import tempfile
+
+        with tempfile.TemporaryDirectory() as tmp:
+            t0 = time.perf_counter()
+            other_bundle = other(Path(tmp) / model_path.name)
+            elapsed = time.perf_counter() - t0
+        _print_metrics("in-memory" if args.streaming else "streaming", other_bundle.metrics, elapsed)
+        if other_bundle.selected_features != bundle.selected_features:
+            print(f"Selected features differ: {other_bundle.selected_features}")
+        gap = abs(bundle.metrics["log_loss"] - other_bundle.metrics["log_loss"])
+        if gap > args.max_gap:
+            print(f"The two modes disagree: log_loss differs by {gap:.4f} (more than --max-gap {args.max_gap:g}).")
+            raise SystemExit(1)
 
 
 if __name__ == "__main__":
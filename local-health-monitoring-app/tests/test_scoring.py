@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BASE_DIR))
+
+import numpy as np
+import pandas as pd
+
+from health_app.ml import train_model_from_csv
+from health_app.scoring import LinearScorer, TreeScorer, load_scorer, scorer_path
+from health_app.selection import select_model
+
+SAMPLE_CSV = BASE_DIR / "data" / "sample_training_data.csv"
+
+
+def _inputs(features: list[str]) -> np.ndarray:
+    # The training rows plus random rows well outside their range, as float32 like the training matrix.
+    X_train = pd.read_csv(SAMPLE_CSV)[features].fillna(0.0).astype(np.float32).to_numpy()
+    rng = np.random.default_rng(0)
+    lo, hi = X_train.min(axis=0), X_train.max(axis=0)
+    span = np.where(hi > lo, hi - lo, 1.0)
+    X_rand = (lo - span + rng.random((500, len(features))) * 3 * span).astype(np.float32)
+    return np.vstack([X_train, X_rand])
+
+
+def _sklearn_proba(bundle, X: np.ndarray) -> np.ndarray:
+    return bundle.model.predict_proba(bundle.selector.transform(X))[:, list(bundle.model.classes_).index(1)]
+
+
+def test_linear_scorer_matches_sklearn(tmp_path):
+    model_path = tmp_path / "model_bundle.joblib"
+    bundle = train_model_from_csv(SAMPLE_CSV, model_path)
+    scorer = load_scorer(scorer_path(model_path))
+    assert isinstance(scorer, LinearScorer)
+    X = _inputs(bundle.features)
+    assert np.allclose(scorer.score_matrix(X), _sklearn_proba(bundle, X), rtol=0, atol=1e-9)
+
+
+def test_tree_scorer_matches_sklearn(tmp_path):
+    model_path = tmp_path / "model_bundle.joblib"
+    bundle, _ = select_model(
+        pd.read_csv(SAMPLE_CSV), model_path, candidates=[{"model": "tree", "k": 10, "max_depth": 4}], folds=2, n_jobs=1
+    )
+    scorer = load_scorer(scorer_path(model_path))
+    assert isinstance(scorer, TreeScorer)
+    X = _inputs(bundle.features)
+    assert np.allclose(scorer.score_matrix(X), _sklearn_proba(bundle, X), rtol=0, atol=1e-9)
@@ -0,0 +1,6 @@
+from __future__ import annotations
+
+from app import create_app
+
+# Module-level so `gunicorn wsgi:app --preload` (or any WSGI server) builds the app once in the master.
+app = create_app()